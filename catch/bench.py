@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Per-call cost of @catch, printing as before against recording to a sink,
+for a function that receives a large argument.
+
+Usage: python bench.py
+"""
+
+import contextlib
+import io
+import timeit
+
+from catch import catch, RingBuffer, OneInN
+
+
+def make():
+    # a new function object for each row, so that no row sees another's
+    def f(data, scale=1.0, *rest, **options):
+        return scale
+    return f
+
+
+if __name__ == '__main__':
+    data = list(range(10 ** 6))
+    calls = [
+        ('plain function', make()),
+        ('@catch, print', catch(make())),
+        ('@catch(sink=RingBuffer())', catch(make(), sink=RingBuffer())),
+        ('@catch(sink=RingBuffer(), capture=\'repr\')',
+         catch(make(), sink=RingBuffer(), capture='repr')),
+        ('@catch(sink=RingBuffer(), sample=OneInN(1000))',
+         catch(make(), sink=RingBuffer(), sample=OneInN(1000))),
+        ('@catch(sink=RingBuffer(), swap=True)',
+         catch(make(), sink=RingBuffer(), swap=True)),
+        ('@catch(debug=False)', catch(make(), debug=False)),
+    ]
+    for label, g in calls:
+        with contextlib.redirect_stdout(io.StringIO()):
+            n, t = timeit.Timer(lambda: g(data, 2.0, 3, key=4)).autorange()
+        print('%-50s %12.1f us' % (label, t / n * 1e6))
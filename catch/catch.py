@@ -8,22 +8,105 @@ the arguments passed to a function.
 
 # Author: Fu Lei <lei dot fu at connect dot ust dot hk>
 
+import atexit
+import collections
 import functools
 import copy
 import inspect
+import json
+import logging
+import math
+import os
+import random
+import reprlib
+import threading
+import time
+import tracemalloc
+import types
+import warnings
+import weakref
 
 
-__all__ = ['catch']
+__all__ = ['catch', 'enable', 'disable', 'is_enabled',
+           'RingBuffer', 'JSONLinesSink', 'LoggingSink', 'AsyncSink',
+           'OneInN', 'TokenBucket', 'FirstShapes', 'Profiler']
 
 
-def catch(f):
+# parameter categories, worded as in the glossary
+CATEGORIES = {
+    inspect.Parameter.POSITIONAL_ONLY: 'positional-only',
+    inspect.Parameter.POSITIONAL_OR_KEYWORD: 'positional-or-keyword',
+    inspect.Parameter.VAR_POSITIONAL: 'var-positional',
+    inspect.Parameter.KEYWORD_ONLY: 'keyword-only',
+    inspect.Parameter.VAR_KEYWORD: 'var-keyword',
+}
+
+
+# catching is on unless the environment variable CATCH says otherwise
+ENABLED = os.environ.get('CATCH', '1').strip().lower() not in \
+    {'0', 'false', 'off', 'no'}
+
+# for enable() and disable(), wrapper ==> [on or off], or, for swap=True,
+# function ==> (original code, trampoline code)
+_registry = weakref.WeakKeyDictionary()
+
+
+def catch(f=None, *, debug=True, sink=None, capture='ref', limit=80,
+          sample=None, profile=None, swap=False):
     """
     A decorator that catches parameter names, parameter categories, and values
     of the arguments passed to a function.
 
     How to Use
     ----------
-    Put the @catch above the defitnition of the function to decorate.
+    Put the @catch, or @catch(), above the defitnition of the function to
+    decorate. To turn off catching, set @catch(debug=False), or CATCH=0 in
+    the environment, so that the decorator does nothing.
+
+    Turned off, @catch returns the function itself, unwrapped, so calls cost
+    nothing extra. Turned on, it returns a wrapper, and leaves the function
+    as it was. Catching can then be turned on and off at run time with
+    enable() and disable(), without decorating anything again.
+
+    With swap=True, the function itself is changed instead: enable() and
+    disable() swap its code in place, so that references held elsewhere
+    follow along, and it can be turned on later even if turned off now.
+
+    To keep records instead of printing, give a sink, like
+    @catch(sink=RingBuffer(1000)). Each call then makes one record:
+        {'function': ..., 'time': ..., 'arguments': [
+            {'name': ..., 'category': ..., 'value': ..., 'is_default': ...},
+            ...]}
+    with the arguments bound by a signature computed once, and nothing
+    copied. A sink is any callable that takes a record, such as RingBuffer,
+    JSONLinesSink or LoggingSink; wrap it in AsyncSink to write it from a
+    background thread instead.
+
+    Parameters
+    ----------
+    debug : bool (default: True)
+        whether to start catching right away; ignored if CATCH=0
+    sink : callable (default: None)
+        where records go; None to print, as before
+    capture : str (default: 'ref')
+        - 'ref'
+                keep a reference to each value
+        - 'repr'
+                keep a repr of each value, cut to limit characters
+    limit : int (default: 80)
+        longest repr kept, for capture='repr'
+    sample : callable (default: None)
+        decides, before anything is bound or copied, whether to catch a
+        call, as sample(args, kwargs) ==> bool; OneInN, TokenBucket and
+        FirstShapes are provided; None to catch every call. The decorated
+        function then has catch_stats(), which returns the numbers of
+        calls, sampled calls and dropped calls so far.
+    profile : Profiler (default: None)
+        if given, time each call into it, by argument shape; arguments are
+        then only printed if a sink is also given
+    swap : bool (default: False)
+        if True, swap the code of a plain function in place, rather than
+        return a wrapper; catching f again then adds to what is there
 
     What Does it Do
     ---------------
@@ -38,6 +121,683 @@ def catch(f):
     ----------
     https://docs.python.org/3/glossary.html#term-parameter
     """
+    if isinstance(f, bool):
+        # @catch(True) or @catch(False)
+        f, debug = None, f
+    if f is None:
+        return lambda f: catch(f, debug=debug, sink=sink, capture=capture,
+                               limit=limit, sample=sample, profile=profile,
+                               swap=swap)
+    on = debug and ENABLED
+
+    if not swap or not isinstance(f, types.FunctionType):
+        if not on:
+            return f
+        return _switch(f, _catcher(f, sink, capture, limit, sample, profile))
+
+    # the wrapper calls a copy of f as it is now, so that f itself can take
+    # other code, and catching f again wraps what was there
+    code = f.__code__
+    original = types.FunctionType(code, f.__globals__, f.__name__,
+                                  f.__defaults__, f.__closure__)
+    functools.update_wrapper(original, f, updated=())
+    original.__kwdefaults__ = f.__kwdefaults__
+    del original.__wrapped__
+    try:
+        # that of f before any swap, not that of a trampoline
+        f.__signature__ = original.__signature__ = inspect.signature(f)
+    except (TypeError, ValueError):
+        pass
+    g = _catcher(original, sink, capture, limit, sample, profile)
+    _registry[f] = (code, _trampoline(f, g))
+    if hasattr(g, 'catch_stats'):
+        f.catch_stats = g.catch_stats
+    if on:
+        enable(f)
+    return f
+
+
+def _switch(f, g):
+    """
+    Returns a wrapper of f that calls g while catching is on, and f while
+    it is off, as set by enable() and disable().
+    """
+    state = [True]
+    if inspect.iscoroutinefunction(f):
+        async def w(*args, **kwargs):
+            return await (g if state[0] else f)(*args, **kwargs)
+    else:
+        def w(*args, **kwargs):
+            return (g if state[0] else f)(*args, **kwargs)
+    functools.update_wrapper(w, f)
+    if hasattr(g, 'catch_stats'):
+        w.catch_stats = g.catch_stats
+    _registry[w] = state
+    return w
+
+
+def enable(f=None):
+    """
+    Turns catching on for f, or for every function decorated with @catch.
+    Does nothing if f is not one, as when @catch was off and returned f.
+    """
+    for h in ([f] if f is not None else list(_registry)):
+        _turn(h, True)
+
+
+def disable(f=None):
+    """
+    Turns catching off for f, or for every function decorated with @catch,
+    so that calling it runs its original code and nothing else. Does
+    nothing if f is not one, as when @catch was off and returned f.
+    """
+    for h in ([f] if f is not None else list(_registry)):
+        _turn(h, False)
+
+
+def is_enabled(f):
+    """
+    Tells whether catching is on for f; always False if @catch was off
+    and returned f, which enable cannot turn on.
+    """
+    entry = _registry.get(f)
+    if isinstance(entry, list):
+        return entry[0]
+    return entry is not None and f.__code__ is entry[1]
+
+
+def _turn(f, on):
+    entry = _registry.get(f)
+    if entry is None:
+        # not from @catch, or from @catch when it was off
+        return
+    if isinstance(entry, list):
+        # a wrapper from _switch
+        entry[0] = on
+    else:
+        # a function with its code swapped
+        f.__code__ = entry[1] if on else entry[0]
+
+
+# the target is a placeholder constant, that g itself then takes the place of
+_TRAMPOLINE = '''
+def _catch_outer():
+    %(cells)s
+    %(kind)s %(name)s(*_catch_args, **_catch_kwargs):
+        return %(await)s%(target)r(*_catch_args, **_catch_kwargs)
+        %(uses)s
+    return %(name)s
+'''
+
+
+def _trampoline(f, g):
+    """
+    Returns code that f can take to call g instead: it forwards everything
+    to g, which is one of its constants, and it has the same free variables
+    as f, since a function cannot change the number of its cells.
+    """
+    target = '__catch_%x' % id(g)
+    freevars = f.__code__.co_freevars
+    coroutine = inspect.iscoroutinefunction(f)
+    source = _TRAMPOLINE % {
+        'cells': ' = '.join(freevars + ('None',)),
+        'uses': ', '.join(freevars + ('None',)),
+        'kind': 'async def' if coroutine else 'def',
+        'name': f.__name__ if f.__name__.isidentifier() else 'f',
+        'await': 'await ' if coroutine else '',
+        'target': target}
+    namespace = {}
+    with warnings.catch_warnings():
+        # calling a str constant is what the placeholder is for
+        warnings.simplefilter('ignore', SyntaxWarning)
+        exec(source, namespace)
+    code = namespace['_catch_outer']().__code__
+    consts = tuple(g if type(c) is str and c == target else c
+                   for c in code.co_consts)
+    return code.replace(co_consts=consts, co_name=f.__code__.co_name,
+                        co_filename=f.__code__.co_filename,
+                        co_firstlineno=f.__code__.co_firstlineno)
+
+
+def _catcher(f, sink, capture, limit, sample, profile):
+    """
+    Wraps f with catching as configured.
+    """
+    call = f if profile is None else profile.wrap(f)
+    if sink is not None:
+        g = _recorder(f, sink, capture, limit, call)
+    elif profile is None:
+        g = _printer(f)
+    else:
+        g = call
+    if sample is not None:
+        g = _sampler(f, g, sample)
+    if inspect.iscoroutinefunction(f):
+        g = _coroutine(g)
+    return g
+
+
+def _coroutine(g):
+    """
+    Wraps g, which returns a coroutine, in a coroutine function, so that
+    the decorated function still looks like one.
+    """
+    async def a(*args, **kwargs):
+        return await g(*args, **kwargs)
+    return functools.update_wrapper(a, g)
+
+
+def _sampler(f, g, sample):
+    """
+    Calls g for the calls that sample picks, and f directly for the rest.
+    """
+    stats = {'calls': 0, 'sampled': 0}
+
+    @functools.wraps(f)
+    def h(*args, **kwargs):
+        stats['calls'] += 1
+        if not sample(args, kwargs):
+            return f(*args, **kwargs)
+        stats['sampled'] += 1
+        return g(*args, **kwargs)
+
+    def catch_stats():
+        calls, sampled = stats['calls'], stats['sampled']
+        return {'calls': calls, 'sampled': sampled, 'dropped': calls - sampled}
+
+    h.catch_stats = catch_stats
+    return h
+
+
+class OneInN(object):
+    """
+    Samples each call with probability 1 / n. Rather than drawing a random
+    number per call, it draws the geometric gap to the next sampled call,
+    so a dropped call only counts down.
+    """
+
+    def __init__(self, n, seed=None):
+        if n < 1:
+            raise ValueError('n must be at least 1')
+        self.log_q = math.log1p(-1 / n) if n > 1 else None
+        self.random = random.Random(seed).random
+        self.countdown = self.gap()
+
+    def gap(self):
+        if self.log_q is None:
+            return 1
+        return int(math.log(1 - self.random()) / self.log_q) + 1
+
+    def __call__(self, args, kwargs):
+        self.countdown -= 1
+        if self.countdown > 0:
+            return False
+        self.countdown = self.gap()
+        return True
+
+
+class TokenBucket(object):
+    """
+    Samples at most rate calls per second on average, and at most burst
+    calls in a row.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def __call__(self, args, kwargs):
+        now = time.monotonic()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class FirstShapes(object):
+    """
+    Samples the first call of each of the first k argument shapes, where
+    the shape of a call is the types of its positional arguments, and the
+    names and types of its keyword arguments.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.seen = set()
+
+    def __call__(self, args, kwargs):
+        if len(self.seen) >= self.k:
+            return False
+        shape = (tuple(map(type, args)),
+                 tuple((x, type(v)) for x, v in kwargs.items()))
+        if shape in self.seen:
+            return False
+        self.seen.add(shape)
+        return True
+
+
+def _recorder(f, sink, capture, limit, call=None):
+    """
+    Wraps f so that each call sends a record of its arguments to sink,
+    before calling call, which defaults to f.
+    """
+    call = f if call is None else call
+    sig = inspect.signature(f)
+    params = [(p.name, CATEGORIES[p.kind], p.default, p.kind)
+              for p in sig.parameters.values()]
+    empty = {inspect.Parameter.VAR_POSITIONAL: (),
+             inspect.Parameter.VAR_KEYWORD: {}}
+    if capture == 'ref':
+        def keep(x):
+            return x
+    elif capture == 'repr':
+        keep = _capped_repr(limit)
+    else:
+        raise ValueError("capture must be 'ref' or 'repr'")
+    name = f.__qualname__
+
+    @functools.wraps(f)
+    def g(*args, **kwargs):
+        passed = sig.bind(*args, **kwargs).arguments
+        arguments = []
+        for x, category, default, kind in params:
+            if x in passed:
+                value, is_default = passed[x], False
+            else:
+                value, is_default = empty.get(kind, default), True
+            arguments.append({'name': x, 'category': category,
+                              'value': keep(value), 'is_default': is_default})
+        sink({'function': name, 'time': time.time(),
+              'arguments': arguments})
+        return call(*args, **kwargs)
+    return g
+
+
+def _capped_repr(limit):
+    r = reprlib.Repr()
+    r.maxstring = r.maxother = limit
+    r.maxlong = limit
+
+    def keep(x):
+        s = r.repr(x)
+        return s if len(s) <= limit else s[:limit - 3] + '...'
+    return keep
+
+
+class RingBuffer(object):
+    """
+    Sink that keeps the last maxlen records in memory.
+    """
+
+    def __init__(self, maxlen=1000):
+        self.records = collections.deque(maxlen=maxlen)
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def __iter__(self):
+        return iter(list(self.records))
+
+    def __len__(self):
+        return len(self.records)
+
+
+class JSONLinesSink(object):
+    """
+    Sink that appends each record to a file as a line of JSON. Values that
+    JSON cannot hold are written as their repr.
+    """
+
+    def __init__(self, file):
+        self.file = open(file, 'a', encoding='utf-8') \
+            if isinstance(file, str) else file
+        self.lock = threading.Lock()
+
+    def __call__(self, record):
+        self.write_many([record])
+
+    def write_many(self, records):
+        lines = ''.join(json.dumps(r, default=repr, ensure_ascii=False) + '\n'
+                        for r in records)
+        with self.lock:
+            self.file.write(lines)
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class AsyncSink(object):
+    """
+    Sink that queues records and hands them to another sink from a
+    background thread, in batches, so the decorated call does no I/O.
+
+    Parameters
+    ----------
+    target : callable
+        sink to hand records to; if it has write_many(records), each batch
+        goes to it in one call
+    maxsize : int (default: 10000)
+        most records to hold
+    overflow : str (default: 'drop')
+        - 'drop'
+                drop records while the queue is full, counted in dropped
+        - 'block'
+                make the caller wait until there is room
+    batch : int (default: 256)
+        most records to hand over at a time
+    interval : float (default: 0.1)
+        seconds between drains when the queue is not filling up
+
+    Records are appended to a deque, which is thread-safe without a lock,
+    so any number of threads, or coroutines, may share one AsyncSink.
+    Whatever is left is handed over when close() is called, which happens
+    at the latest when the interpreter exits; records that come after that
+    are not written, but counted in dropped.
+    """
+
+    def __init__(self, target, maxsize=10000, overflow='drop', batch=256,
+                 interval=0.1):
+        if overflow not in {'drop', 'block'}:
+            raise ValueError("overflow must be 'drop' or 'block'")
+        self.target = target
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.batch = batch
+        self.interval = interval
+        self.dropped = 0
+        self.lock = threading.Lock()   # for dropped
+        self.queue = collections.deque()
+        self.wakeup = threading.Event()
+        self.not_full = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._drain_forever,
+                                       name='catch-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def __call__(self, record):
+        queue = self.queue
+        if self.closed:
+            self._drop(1)
+            return
+        if len(queue) >= self.maxsize:
+            if self.overflow == 'drop':
+                self._drop(1)
+                return
+            with self.not_full:
+                while len(queue) >= self.maxsize and not self.closed:
+                    self.wakeup.set()
+                    self.not_full.wait(self.interval)
+        queue.append(record)
+        if self.closed:
+            # close() may have handed over the last batch already, so
+            # whatever is still queued would never be written
+            self._discard()
+        elif len(queue) >= self.batch:
+            self.wakeup.set()
+
+    def _drop(self, n):
+        with self.lock:
+            self.dropped += n
+
+    def _discard(self):
+        n = 0
+        try:
+            while True:
+                self.queue.popleft()
+                n += 1
+        except IndexError:
+            pass
+        self._drop(n)
+
+    def _drain_forever(self):
+        while not self.closed:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            self._drain()
+
+    def _drain(self):
+        queue, popleft = self.queue, self.queue.popleft
+        write_many = getattr(self.target, 'write_many', None)
+        while queue:
+            records = []
+            try:
+                for _ in range(self.batch):
+                    records.append(popleft())
+            except IndexError:
+                pass
+            if self.overflow == 'block':
+                with self.not_full:
+                    self.not_full.notify_all()
+            try:
+                if write_many is not None:
+                    write_many(records)
+                else:
+                    for record in records:
+                        self.target(record)
+            except Exception:
+                # a failing sink must not stop the writer
+                logging.getLogger(__name__).exception(
+                    'catch: failed to write %d records', len(records))
+        flush = getattr(self.target, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def close(self):
+        """
+        Stops the background thread, and hands over what is left.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        self.thread.join()
+        self._drain()
+        atexit.unregister(self.close)
+
+
+class LoggingSink(object):
+    """
+    Sink that logs each record as one line, with the record itself attached
+    to the log record as catch_record.
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        if logger is None or isinstance(logger, str):
+            logger = logging.getLogger(logger or __name__)
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, record):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, '%s(%s)', record['function'],
+                            ', '.join('%s=%s%s' % (
+                                a['name'], a['value'],
+                                ' (default)' if a['is_default'] else '')
+                                for a in record['arguments']),
+                            extra={'catch_record': record})
+
+
+class Profiler(object):
+    """
+    Collects wall time, CPU time, and optionally peak traced memory, of
+    calls to functions decorated with @catch(profile=...), grouped by
+    function and by argument shape: the types of the arguments, with the
+    len() or .shape of those that have one, but never their values.
+
+    Parameters
+    ----------
+    memory : bool (default: False)
+        also record the peak memory allocated during each call, with
+        tracemalloc, which is started if need be; it slows calls down, and
+        is only meaningful when calls do not overlap in time
+    maxsamples : int (default: 10000)
+        most recent calls kept per function and shape, for percentiles
+
+    Examples
+    --------
+    >>> profiler = Profiler()
+    >>> @catch(profile=profiler)
+    ... def total(x, scale=1):
+    ...     return sum(x) * scale
+    >>> total([1, 2, 3]), total([1, 2, 3], scale=2), total(range(10))
+    (6, 12, 45)
+    >>> sorted((k[1], v['calls']) for k, v in profiler.stats().items())
+    [(('list[3]',), 1), (('list[3]', 'scale=int'), 1), (('range[10]',), 1)]
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, memory=False, maxsamples=10000):
+        self.memory = memory
+        self.maxsamples = maxsamples
+        self.samples = {}   # (function, shape) ==> deque of measurements
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def wrap(self, f):
+        """
+        Returns f timed into this profiler.
+        """
+        name = f.__qualname__
+        record = self.record
+        memory = self.memory
+        perf_counter, thread_time = time.perf_counter, time.thread_time
+
+        def before():
+            if memory:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            else:
+                base = 0
+            return perf_counter(), thread_time(), base
+
+        def after(args, kwargs, start):
+            wall = perf_counter() - start[0]
+            cpu = thread_time() - start[1]
+            peak = tracemalloc.get_traced_memory()[1] - start[2] \
+                if memory else None
+            record(name, _shape(args, kwargs), wall, cpu, peak)
+
+        if inspect.iscoroutinefunction(f):
+            @functools.wraps(f)
+            async def timed(*args, **kwargs):
+                start = before()
+                try:
+                    return await f(*args, **kwargs)
+                finally:
+                    after(args, kwargs, start)
+        else:
+            @functools.wraps(f)
+            def timed(*args, **kwargs):
+                start = before()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    after(args, kwargs, start)
+        return timed
+
+    def record(self, function, shape, wall, cpu, peak=None):
+        key = (function, shape)
+        with self.lock:
+            samples = self.samples.get(key)
+            if samples is None:
+                samples = self.samples[key] = \
+                    collections.deque(maxlen=self.maxsamples)
+            samples.append((wall, cpu, peak))
+            self.calls[key] += 1
+
+    def stats(self):
+        """
+        Returns {(function, shape): summary}, where summary holds the number
+        of calls, and the p50, p95 and p99 of wall and cpu times in seconds,
+        and of peak memory in bytes if recorded.
+        """
+        with self.lock:
+            items = [(k, list(v)) for k, v in self.samples.items()]
+            calls = dict(self.calls)
+        result = {}
+        for key, samples in items:
+            summary = {'calls': calls[key]}
+            for i, what in enumerate(('wall', 'cpu', 'peak')):
+                values = sorted(s[i] for s in samples if s[i] is not None)
+                if values:
+                    summary[what] = {'p%d' % q: _percentile(values, q)
+                                     for q in self.PERCENTILES}
+            result[key] = summary
+        return result
+
+    def to_json(self, **kwargs):
+        """
+        Returns stats() as a JSON list, one entry per function and shape.
+        """
+        return json.dumps([dict(function=k[0], shape=list(k[1]), **v)
+                           for k, v in self.stats().items()], **kwargs)
+
+    def report(self):
+        """
+        Returns stats() as a text table, slowest p95 wall time first.
+        """
+        rows = sorted(self.stats().items(),
+                      key=lambda kv: -kv[1]['wall']['p95'])
+        lines = [line('Profile of Functions Caught', p=':', newline=False),
+                 '%-50s %7s %10s %10s %10s' % ('function(shape)', 'calls',
+                                               'p50 (ms)', 'p95 (ms)',
+                                               'p99 (ms)')]
+        for (function, shape), s in rows:
+            label = '%s(%s)' % (function, ', '.join(shape))
+            lines.append('%-50s %7d %10.3f %10.3f %10.3f' % (
+                label, s['calls'], *(s['wall']['p%d' % q] * 1e3
+                                     for q in self.PERCENTILES)))
+            if 'peak' in s:
+                lines.append('%-50s %7s %10s %10s %10s' % (
+                    '    peak memory (KiB)', '',
+                    *('%.1f' % (s['peak']['p%d' % q] / 1024)
+                      for q in self.PERCENTILES)))
+        return '\n'.join(lines)
+
+
+def _percentile(values, q):
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def _shape(args, kwargs):
+    """
+    Shape of a call: type names, with sizes, but no values.
+
+    >>> _shape(([1, 2], 'abc', 3.0), {'n': None})
+    ('list[2]', 'str[3]', 'float', 'n=NoneType')
+    """
+    def one(x):
+        s = getattr(x, 'shape', None)
+        if isinstance(s, tuple):
+            return '%s%s' % (type(x).__name__, s)
+        try:
+            return '%s[%d]' % (type(x).__name__, len(x))
+        except Exception:
+            return type(x).__name__
+    return tuple(one(x) for x in args) + \
+        tuple('%s=%s' % (k, one(v)) for k, v in kwargs.items())
+
+
+def _printer(f):
+    """
+    Wraps f so that each call prints its arguments.
+    """
     @functools.wraps(f)
     def g(*args, **kwargs):
         local = copy.deepcopy(locals())
@@ -145,3 +905,10 @@ def line(s='', p='-', length=75, lead=5, newline=True):
 if __name__ == '__main__':
     foo(0, 1, 2, 22, 222, 2222, d=3, e=4, g=6, h=7, i=8, j=9, k=10)
     foo(a='a', e=2.71828)
+
+    # catch the function under foo again, into records this time
+    records = RingBuffer()
+    bar = catch(foo.__wrapped__, sink=records, capture='repr')
+    bar(0, 1, 2, 22, d=3, e=4, h=7)
+    for record in records:
+        print(json.dumps(record, indent=2))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of inplace editing on a large generated UTF-8 file: the old
+codecs generator, against the block engine, line by line and a block at
+a time, and against patching a few bytes in place with sub; then many
+small files, one by one and across a pool of processes. Chunks of one
+file, and many files, only go faster with more than one CPU.
+
+Usage: python bench.py [size in MB, default 200]
+"""
+
+import codecs
+import os
+import sys
+import tempfile
+import time
+
+from inplace import inplace, rewrite, rewrite_many, sub
+
+
+def codecs_inplace(file, encoding='utf-8'):
+    # the generator as it was, decoding line by line through codecs.open
+    temp = file + '.tmp'
+    with codecs.open(file, 'r', encoding=encoding) as old, \
+            codecs.open(temp, 'w', encoding=encoding) as new:
+        for line in old:
+            yield line, new
+    os.remove(file)
+    os.rename(temp, file)
+
+
+def generate(file, size):
+    line = '第%d行：the quick brown fox jumps over the lazy dog, %s\n'
+    with open(file, 'w', encoding='utf-8') as f:
+        written = i = 0
+        while written < size:
+            text = ''.join(line % (j, 'é' * (j % 7))
+                           for j in range(i, i + 10000))
+            f.write(text)
+            written += len(text.encode('utf-8'))
+            i += 10000
+
+
+def by_line(engine, file):
+    for line, new in engine(file):
+        new.write(line.upper())
+
+
+if __name__ == '__main__':
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as folder:
+        file = os.path.join(folder, 'big.txt')
+        generate(file, int(size * 2 ** 20))
+        mb = os.path.getsize(file) / 2 ** 20
+        runs = [
+            ('codecs generator', lambda: by_line(codecs_inplace, file)),
+            ('inplace generator',
+             lambda: by_line(lambda f: inplace(f, backup=False), file)),
+            ('rewrite by line',
+             lambda: rewrite(file, str.upper, backup=False)),
+            ('rewrite by block',
+             lambda: rewrite(file, str.upper, backup=False, by='block')),
+            ('rewrite in chunks', lambda: rewrite(
+                file, str.upper, backup=False, by='block', processes=None,
+                chunksize=8 << 20)),
+            # one line changes, and keeps its length
+            ('rewrite, one line', lambda: rewrite(
+                file, lambda x: x.replace('第12345行', '第54321行'),
+                backup=False, by='block')),
+            ('sub, one line', lambda: sub(
+                file, '第54321行'.encode(), '第12345行'.encode())),
+        ]
+        print('%.1f MB' % mb)
+        for label, run in runs:
+            t = time.perf_counter()
+            run()
+            t = time.perf_counter() - t
+            print('%-20s %8.2f s %8.1f MB/s' % (label, t, mb / t))
+
+    print('\n500 files of 100 KB')
+    with tempfile.TemporaryDirectory() as folder:
+        for i in range(500):
+            generate(os.path.join(folder, '%04d.txt' % i), 100000)
+        pattern = os.path.join(folder, '*.txt')
+        for processes in (1, None):
+            t = time.perf_counter()
+            rewrite_many(pattern, str.upper, backup=False, by='block',
+                         processes=processes)
+            print('processes=%-6s %8.2f s'
+                  % (processes, time.perf_counter() - t))
@@ -7,6 +7,12 @@ does not allow inplace editing with specified encoding.
 
 This function, adapted from by @robru on stackoverflow, helps to achieve this.
 
+The file is read in large binary blocks and decoded a block at a time. The
+new contents go to a temporary file in the same folder, which is flushed to
+disk and then atomically takes the place of the file, so that at any moment
+the file is either all old or all new, even if the editing fails half way
+or the machine crashes.
+
 References
 ----------
 
@@ -19,27 +25,631 @@ https://stackoverflow.com/questions/25203040/fileinput-inplace-filtering-encodin
 
 # Author: Fu Lei <lei dot fu at connect dot ust dot hk>
 
+from collections import namedtuple
+from concurrent import futures
+import codecs
+import contextlib
+import glob
+import io
+import mmap
 import os
 import os.path
+import re
 import shutil
-import codecs
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:   # not on Windows
+    fcntl = None
+
+
+__all__ = ['inplace', 'rewrite', 'rewrite_many', 'mapped', 'sub']
+
+
+BLOCKSIZE = 1 << 20   # bytes read at a time
+
+CHUNKSIZE = 1 << 26   # bytes of a file for one process to rewrite
+
+FICLONE = 0x40049409  # ioctl of Linux, to share the blocks of a file
+
+Result = namedtuple('Result', ['file', 'status', 'bytes_in', 'bytes_out',
+                               'seconds'])
+
+
+def inplace(file, encoding='utf-8', backup=True, blocksize=BLOCKSIZE):
+    '''
+    Edits a file in place, line by line.
+
+    Parameters
+    ----------
+    file : str
+        the file to edit
+    encoding : str (default: 'utf-8')
+        encoding of the file, old and new
+    backup : bool or str (default: True)
+        - False
+                no back-up copy
+        - True or 'hardlink'
+                keep the old file as a .bak hard link to it, which costs no
+                copying, since the new file is a new one; copy if the file
+                system does not support hard links
+        - 'reflink'
+                a copy-on-write clone, as in cp --reflink=auto; copy if the
+                file system does not support it
+        - 'copy'
+                a plain copy
+    blocksize : int (default: 1 MB)
+        number of bytes read at a time
+
+    Yields
+    ------
+    (line, new) : line is a line of the file, with its line ending, and new
+        is the new file, opened for writing in text mode; whatever is
+        written to new becomes the new contents of the file, once the loop
+        is over. If the loop stops early, the file is left as it was.
+    '''
+
+    with _atomic(file, backup) as temp, open(file, 'rb') as old:
+        new = io.TextIOWrapper(temp, encoding=encoding, newline='')
+        try:
+            for block in _blocks(old, encoding, blocksize):
+                for line in block.splitlines(keepends=True):
+                    yield line, new
+            new.flush()
+        finally:
+            new.detach()
+
+
+def rewrite(file, func, encoding='utf-8', backup=True, by='line',
+            blocksize=BLOCKSIZE, processes=1, chunksize=CHUNKSIZE):
+    '''
+    Rewrites a file in place with func, without a Python loop per line if
+    by='block', and in parallel if processes is not 1.
+
+    Parameters
+    ----------
+    file, encoding, backup, blocksize :
+        as in inplace
+    func : callable
+        - by='line'
+                takes a line, with its line ending, and returns the new
+                text for it, which may be any number of lines or none
+        - by='block'
+                takes a block of whole lines, up to a '\\n' or the end of
+                the file, and returns the new text for it; where blocks
+                begin and end varies, so func should treat each line on its
+                own
+    by : str (default: 'line')
+        'line' or 'block'
+    processes : int or None (default: 1)
+        number of processes, None for the number of CPUs. If not 1, the file
+        is cut into chunks of about chunksize bytes, just after a '\\n',
+        which are rewritten by a pool of processes into temporary segments,
+        then joined into the new file. func must then be picklable. The new
+        file is the same as with processes=1. This needs an encoding in
+        which '\\n' is always the byte 0x0A and that has no state, such as
+        UTF-8, Latin-1 or GB18030; for others, the file is rewritten in
+        this process.
+    chunksize : int (default: 64 MB)
+        size of a chunk, for processes other than 1
+
+    Returns
+    -------
+    (bytes_in, bytes_out) : sizes of the old file and the new file
+    '''
+
+    if by not in ('line', 'block'):
+        raise ValueError('by must be \'line\' or \'block\'')
+    if processes != 1 and _splittable(encoding):
+        bounds = _chunks(file, chunksize)
+        if len(bounds) > 2:
+            return _rewrite_chunks(file, func, encoding, backup, by,
+                                   blocksize, processes, bounds)
+    with _atomic(file, backup) as new, open(file, 'rb') as old:
+        bytes_out = _transform(old, new, func, encoding, by, blocksize)
+        bytes_in = old.tell()
+    return bytes_in, bytes_out
+
+
+def _transform(old, new, func, encoding, by, blocksize, size=-1):
+    '''
+    Writes func of the text of old to new, binary files both, reading at
+    most size bytes if size is not -1, and returns the bytes written.
+    '''
+    encoder = codecs.getincrementalencoder(encoding)()
+    bytes_out = 0
+    for block in _blocks(old, encoding, blocksize, size):
+        if by == 'line':
+            text = ''.join(map(func, block.splitlines(keepends=True)))
+        else:
+            text = func(block)
+        data = encoder.encode(text)
+        new.write(data)
+        bytes_out += len(data)
+    data = encoder.encode('', final=True)
+    new.write(data)
+    return bytes_out + len(data)
+
+
+def _splittable(encoding):
+    '''
+    Tells whether a file in encoding can be cut just after any b'\\n' and
+    the pieces decoded, and encoded back, on their own.
+    '''
+    name = codecs.lookup(encoding).name
+    return 'a\n'.encode(encoding) == b'a\n' and \
+        not name.startswith(('iso2022', 'hz', 'utf-7', 'utf_7'))
+
+
+def _chunks(file, chunksize):
+    '''
+    Returns the offsets [0, ..., size] that cut file into chunks of about
+    chunksize bytes, each cut just after a b'\\n'.
+    '''
+    bounds = [0]
+    with _readonly(file) as data:
+        size = len(data)
+        while bounds[-1] + chunksize < size:
+            i = data.find(b'\n', bounds[-1] + chunksize - 1)
+            if i == -1 or i + 1 == size:
+                break
+            bounds.append(i + 1)
+    bounds.append(size)
+    return bounds
+
+
+def _rewrite_chunks(file, func, encoding, backup, by, blocksize, processes,
+                    bounds):
+    folder = os.path.dirname(os.path.abspath(file))
+    jobs = [(file, start, stop, func, encoding, by, blocksize, folder)
+            for start, stop in zip(bounds[:-1], bounds[1:])]
+    segments = []
+    try:
+        with futures.ProcessPoolExecutor(processes) as pool:
+            for segment in pool.map(_rewrite_chunk, jobs):
+                segments.append(segment)
+        bytes_out = 0
+        with _atomic(file, backup) as new:
+            new.flush()
+            for segment, size in segments:
+                _append(new.fileno(), segment, size)
+                bytes_out += size
+    except BaseException:
+        # segments done by workers but not yet handed back
+        _remove_temps(file)
+        raise
+    finally:
+        for segment, _ in segments:
+            if os.path.exists(segment):
+                os.remove(segment)
+    return bounds[-1], bytes_out
+
+
+def _rewrite_chunk(job):
+    '''
+    Rewrites bytes start to stop of file into a temporary segment, in a
+    worker, and returns (segment, its size).
+    '''
+    file, start, stop, func, encoding, by, blocksize, folder = job
+    fd, segment = tempfile.mkstemp(dir=folder, suffix='.tmp',
+                                   prefix='.' + os.path.basename(file) + '.')
+    try:
+        with open(fd, 'wb', buffering=BLOCKSIZE) as new, \
+                open(file, 'rb') as old:
+            old.seek(start)
+            size = _transform(old, new, func, encoding, by, blocksize,
+                              stop - start)
+    except BaseException:
+        os.remove(segment)
+        raise
+    return segment, size
+
+
+def _append(dst, segment, size):
+    '''
+    Appends segment to the end of file descriptor dst, with copy_file_range
+    or sendfile if possible, or else read/write.
+    '''
+    with open(segment, 'rb') as f:
+        src = f.fileno()
+        offset = 0
+        for copy in (getattr(os, 'copy_file_range', None),
+                     getattr(os, 'sendfile', None)):
+            if copy is None:
+                continue
+            try:
+                while offset < size:
+                    if copy is os.sendfile:
+                        n = copy(dst, src, offset, size - offset)
+                    else:
+                        n = copy(src, dst, size - offset, offset)
+                    if n == 0:
+                        break
+                    offset += n
+            except OSError:
+                # not for these files, go on the next way from where it is
+                continue
+            if offset >= size:
+                return
+        f.seek(offset)
+        while offset < size:
+            data = f.read(min(BLOCKSIZE, size - offset))
+            if not data:
+                break
+            os.write(dst, data)
+            offset += len(data)
+
+
+def rewrite_many(files, func, encoding='utf-8', backup=True, by='line',
+                 processes=None, transactional=False, blocksize=BLOCKSIZE):
+    '''
+    Rewrites many files with the same func, as rewrite does, across a pool
+    of processes.
+
+    Parameters
+    ----------
+    files : str or iterable of str
+        a glob pattern, like 'logs/**/*.log', or the files themselves
+    func, encoding, backup, by, blocksize :
+        as in rewrite; func must be picklable, such as a function defined
+        at the top level of a module
+    processes : int or None (default: None)
+        size of the process pool, None for the number of CPUs; 1 to run in
+        this process. At most twice as many files as processes are in
+        flight at a time, so that a long list does not pile up in the pool.
+    transactional : bool (default: False)
+        if True, all or nothing: once a file fails, no more files are
+        started, and every file rewritten so far is rolled back to how it
+        was, from a hard link to the old file kept until the end
+
+    Returns
+    -------
+    list of Result(file, status, bytes_in, bytes_out, seconds), in the order
+    of files, status being 'ok', 'failed: <error>', 'rolled back' or
+    'not run'
+    '''
 
+    if isinstance(files, str):
+        files = sorted(glob.glob(files, recursive=True))
+    files = list(dict.fromkeys(files))
+    jobs = [(file, func, encoding, backup, by, blocksize, transactional)
+            for file in files]
+    results = {}
+
+    if processes == 1:
+        for job in jobs:
+            result = results[job[0]] = _rewrite_job(job)
+            if transactional and result.status != 'ok':
+                break
+    else:
+        # at most twice as many files in flight as processes
+        bound = 2 * (processes or os.cpu_count() or 1)
+        with futures.ProcessPoolExecutor(processes) as pool:
+            pending = {}
+            jobs = iter(jobs)
+            stop = False
+            while True:
+                while not stop and len(pending) < bound:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    try:
+                        pending[pool.submit(_rewrite_job, job)] = job[0]
+                    except futures.BrokenExecutor as e:
+                        results[job[0]] = Result(job[0], 'failed: %r' % e,
+                                                 0, 0, 0.0)
+                        stop = transactional
+                if not pending:
+                    break
+                done, _ = futures.wait(pending,
+                                       return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    file = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:   # the worker died
+                        result = Result(file, 'failed: %r' % e, 0, 0, 0.0)
+                    results[file] = result
+                    stop = stop or (transactional and result.status != 'ok')
+
+    failed = any(x.status != 'ok' for x in results.values())
+    for file in files:
+        result = results.get(file)
+        if result is None:
+            results[file] = Result(file, 'not run', 0, 0, 0.0)
+            continue
+        if result.status != 'ok':
+            _remove_temps(file)
+        keep = _rollback_name(file)
+        if transactional and os.path.lexists(keep):
+            # a worker that died may have left its file rewritten or not
+            if failed and not os.path.samefile(keep, file):
+                os.replace(keep, file)
+            else:
+                os.remove(keep)
+            if failed and result.status == 'ok':
+                results[file] = result._replace(status='rolled back')
+    return [results[file] for file in files]
+
+
+def _rewrite_job(job):
+    '''
+    Rewrites one file, in a worker, and returns its Result.
+    '''
+    file, func, encoding, backup, by, blocksize, transactional = job
+    t = time.perf_counter()
+    keep = None
+    try:
+        if transactional:
+            keep = _rollback_name(file)
+            _backup(file, keep, 'hardlink')
+        bytes_in, bytes_out = rewrite(file, func, encoding, backup, by,
+                                      blocksize)
+    except Exception as e:
+        if keep is not None and os.path.lexists(keep):
+            os.remove(keep)
+        return Result(file, 'failed: %r' % e, 0, 0, time.perf_counter() - t)
+    return Result(file, 'ok', bytes_in, bytes_out, time.perf_counter() - t)
+
+
+def _rollback_name(file):
+    folder, name = os.path.split(file)
+    return os.path.join(folder, '.%s.rollback' % name)
+
+
+def _remove_temps(file):
+    '''
+    Removes the temporary files that a worker killed while rewriting file
+    had no chance to.
+    '''
+    folder, name = os.path.split(os.path.abspath(file))
+    pattern = os.path.join(glob.escape(folder), glob.escape('.%s.' % name))
+    for temp in glob.glob(pattern + '*.tmp'):
+        os.remove(temp)
+
+
+@contextlib.contextmanager
+def mapped(file, backup=False):
+    '''
+    Maps a file into memory, for editing bytes in place, without rewriting
+    the file: only the pages changed are written back, at the end of the
+    with block. The size of the file cannot change.
+
+    Unlike inplace, the edits are not atomic: if the editing fails half way,
+    the edits done so far stay. Take a back-up if that matters.
+
+    Parameters
+    ----------
+    file : str
+        the file to edit
+    backup : bool or str (default: False)
+        as in inplace, except that a hard link would change along with the
+        file, so True or 'hardlink' makes a copy-on-write clone, or a copy
+
+    Yields
+    ------
+    view : writable memoryview of the bytes of the file, which must not be
+        kept, nor any slice of it, beyond the with block
+
+    Examples
+    --------
+    >>> with open('mapped.txt', 'wb') as f:
+    ...     _ = f.write(b'id=12345 ok\\n')
+    >>> with mapped('mapped.txt') as view:
+    ...     view[3:8] = b'*****'
+    >>> open('mapped.txt', 'rb').read()
+    b'id=***** ok\\n'
+    >>> os.remove('mapped.txt')
+    '''
 
-def inplace(file, encoding='utf-8', backup=True):
     if backup:
-        name, ext = os.path.splitext(file)
-        shutil.copy(file, name + '.bak')
-    temp = name + '.tmp'
-    with codecs.open(file, 'r', encoding=encoding) as old, \
-            codecs.open(temp, 'w', encoding=encoding) as new:
-            for line in old:
-                yield line, new
-    os.remove(file)
-    os.rename(temp, file)
+        _backup(file, os.path.splitext(file)[0] + '.bak',
+                'reflink' if backup in (True, 'hardlink') else backup)
+    with open(file, 'r+b') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # an empty file cannot be mapped
+            yield memoryview(bytearray())
+            return
+        with mmap.mmap(f.fileno(), 0) as mm:
+            view = memoryview(mm)
+            try:
+                yield view
+                mm.flush()
+            finally:
+                view.release()
+
+
+def sub(file, pattern, repl, count=0, flags=0, backup=False):
+    '''
+    Replaces the matches of a regular expression in a file, as re.sub does
+    in a string, and returns the number of replacements.
+
+    If every replacement is as long as what it replaces, as in masking IDs
+    or fixing fixed-width fields, the bytes are patched in place through
+    mapped, costing O(bytes changed); otherwise the file is rewritten as in
+    inplace, copying the bytes between the matches.
+
+    Parameters
+    ----------
+    file : str
+        the file to edit
+    pattern : bytes or compiled bytes pattern
+        regular expression, matched against the raw bytes of the file
+    repl : bytes or callable
+        replacement, as in re.sub: a template like br'\\1-\\2', or a function
+        that takes a match and returns bytes
+    count : int (default: 0)
+        largest number of replacements, 0 for all
+    flags : int (default: 0)
+        flags of re, if pattern is not compiled
+    backup : bool or str (default: False)
+        as in mapped if patched in place, or as in inplace if rewritten
+
+    Examples
+    --------
+    >>> with open('sub.txt', 'wb') as f:
+    ...     _ = f.write(b'2018-06-24 a\\n2018-06-25 b\\n')
+    >>> sub('sub.txt', br'(\\d{4})-(\\d\\d)-(\\d\\d)', br'\\3/\\2/\\1')
+    2
+    >>> sub('sub.txt', br'/', b'')
+    4
+    >>> open('sub.txt', 'rb').read()
+    b'24062018 a\\n25062018 b\\n'
+    >>> os.remove('sub.txt')
+    '''
+
+    if not isinstance(pattern, re.Pattern):
+        pattern = re.compile(pattern, flags)
+    expand = repl if callable(repl) else (lambda m: m.expand(repl))
+
+    # find every replacement first, so that nothing is patched unless all
+    # of them can be
+    with _readonly(file) as data:
+        changes = _scan(data, pattern, expand, count)
+    if not changes:
+        return 0
+
+    if all(end - start == len(new) for start, end, new in changes):
+        with mapped(file, backup) as view:
+            for start, end, new in changes:
+                view[start:end] = new
+        return len(changes)
+
+    with _atomic(file, backup) as temp, _readonly(file) as data:
+        view = memoryview(data)
+        try:
+            pos = 0
+            for start, end, new in changes:
+                temp.write(view[pos:start])
+                temp.write(new)
+                pos = end
+            temp.write(view[pos:])
+        finally:
+            view.release()
+    return len(changes)
+
+
+@contextlib.contextmanager
+def _readonly(file):
+    '''
+    Maps a file into memory for reading, or gives b'' if it is empty.
+    '''
+    with open(file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _scan(data, pattern, expand, count):
+    '''
+    Returns [(start, end, replacement), ...] for the matches in data.
+    '''
+    changes = []
+    for m in pattern.finditer(data):
+        changes.append((m.start(), m.end(), expand(m)))
+        if len(changes) == count:
+            break
+    return changes
+
+
+def _blocks(f, encoding, blocksize, size=-1):
+    '''
+    Yields the text of binary file f, decoded a block at a time, in pieces
+    that end just after a '\\n', except for the last one. A line is never
+    split, nor is a '\\r\\n', nor is a multi-byte character. At most size
+    bytes are read, if size is not -1.
+    '''
+    decoder = codecs.getincrementaldecoder(encoding)()
+    tail = ''
+    while True:
+        if size < 0:
+            data = f.read(blocksize)
+        else:
+            data = f.read(min(blocksize, size))
+            size -= len(data)
+        text = tail + decoder.decode(data, final=not data)
+        if not data:
+            if text:
+                yield text
+            return
+        i = text.rfind('\n') + 1
+        if i:
+            yield text[:i]
+        tail = text[i:]
+
+
+@contextlib.contextmanager
+def _atomic(file, backup):
+    '''
+    Opens a temporary binary file next to file, that replaces file at the
+    end of the with block, or is removed if the block fails.
+    '''
+    if backup not in (False, True, 'hardlink', 'reflink', 'copy'):
+        raise ValueError('backup must be False, True, \'hardlink\', '
+                         '\'reflink\' or \'copy\'')
+    folder = os.path.dirname(os.path.abspath(file))
+    fd, temp = tempfile.mkstemp(dir=folder, suffix='.tmp',
+                                prefix='.' + os.path.basename(file) + '.')
+    try:
+        with open(fd, 'wb', buffering=BLOCKSIZE) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(file, temp)
+        if backup:
+            _backup(file, os.path.splitext(file)[0] + '.bak', backup)
+        os.replace(temp, file)
+    except BaseException:
+        os.remove(temp)
+        raise
+    _fsync_folder(folder)
+
+
+def _backup(file, copy, how):
+    if os.path.lexists(copy):
+        os.remove(copy)
+    if how in (True, 'hardlink'):
+        try:
+            os.link(file, copy)
+            return
+        except OSError:
+            pass
+    elif how == 'reflink' and fcntl is not None:
+        with open(file, 'rb') as src, open(copy, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except OSError:
+                shutil.copyfileobj(src, dst, BLOCKSIZE)
+        shutil.copystat(file, copy)
+        return
+    shutil.copy2(file, copy)
+
+
+def _fsync_folder(folder):
+    '''
+    Makes the new name of the file survive a crash, where the OS allows.
+    '''
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
 
 # test: add line numbers in Chinese to each line of a given file in UTF-8
 if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
     file = input('Filename ? ')
     i = 1
     for line, new in inplace(file):
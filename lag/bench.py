@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of genlag against the former one-df.insert-per-lag approach.
+
+Usage: python bench.py
+"""
+
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from lag import genlag, _colname
+
+
+def genlag_insert(s, *args):
+    df = pd.DataFrame(s)
+    for i in args:
+        df.insert(len(df.columns), _colname(s.name, i), s.shift(i))
+    return df.dropna()
+
+
+def timeit(f, *a, **kw):
+    t = time.perf_counter()
+    f(*a, **kw)
+    return time.perf_counter() - t
+
+
+if __name__ == '__main__':
+    warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+    # frame: a DataFrame, to which genlag adds the columns in place
+    print('%10s %6s %12s %12s %12s' % ('rows', 'lags', 'insert (s)',
+                                       'genlag (s)', 'frame (s)'))
+    for n in (10 ** 4, 10 ** 5, 10 ** 6):
+        s = pd.Series(np.random.randn(n), name='x')
+        for k in (10, 50, 200):
+            lags = range(1, k + 1)
+            print('%10d %6d %12.4f %12.4f %12.4f' % (
+                n, k, timeit(genlag_insert, s, *lags),
+                timeit(genlag, s, *lags),
+                timeit(genlag, s.to_frame(), *lags)))
+
+    print('\nPanel of 1000 tickers, 20 lags of 2 columns')
+    print('%10s %12s %12s %12s' % ('rows', 'single (s)', 'sorted (s)',
+                                   'shuffled (s)'))
+    for n in (10 ** 5, 10 ** 6):
+        panel = pd.DataFrame({'id': np.repeat(np.arange(1000), n // 1000),
+                              'x': np.random.randn(n),
+                              'y': np.random.randn(n)})
+        shuffled = panel.sample(frac=1)
+        lags = range(1, 21)
+        # inplace=False, or the first run would add the columns to panel
+        kw = dict(column=['x', 'y'], inplace=False)
+        print('%10d %12.4f %12.4f %12.4f' % (
+            n, timeit(genlag, panel, *lags, **kw),
+            timeit(genlag, panel, *lags, by='id', **kw),
+            timeit(genlag, shuffled, *lags, by='id', **kw)))
@@ -4,10 +4,13 @@
 
 # Author: Fu Lei <lei dot fu at connect dot ust dot hk>
 
+import os
+
+import numpy as np
 import pandas as pd
 
 
-def genlag(x, *args, column=0, inplace=True, na='drop'):
+def genlag(x, *args, column=0, by=None, inplace=True, na='drop'):
     '''
     Generates lagged or future values for a time series.
 
@@ -21,9 +24,20 @@ def genlag(x, *args, column=0, inplace=True, na='drop'):
         1 for lag-1, 2 for lag-2,
         0 for now,  -1 for next-1 (1 period in future), and so on ...
 
+    column : int or label, or list of them (default: 0)
+        Which column(s) of a DataFrame to compute, by position or by label.
+        With several columns, all lags of the first come first, and so on.
+
+    by : label, or list of labels, or array-like (default: None)
+        Group key for panel data, as accepted by DataFrame.groupby. Lags are
+        taken within each group, in the order rows appear, and never cross
+        from one group into another.
+
     inplace : bool (default: True)
         - True
                 keep the original time series in place, and append new columns
+                (to x itself if x is a DataFrame, as well as dropping or
+                filling NaN in x)
         - False
                 generate a new DataFrame
 
@@ -42,6 +56,15 @@ def genlag(x, *args, column=0, inplace=True, na='drop'):
     1    1   0.0    2.0
     2    2   1.0    3.0
     3    3   2.0    4.0
+    >>> panel = pd.DataFrame({'id': ['a', 'a', 'b', 'b', 'a'],
+    ...                       'px': [1.0, 2.0, 10.0, 20.0, 3.0]})
+    >>> genlag(panel, 1, column='px', by='id', na='keep')
+      id    px  px_lag1
+    0  a   1.0      NaN
+    1  a   2.0      1.0
+    2  b  10.0      NaN
+    3  b  20.0     10.0
+    4  a   3.0      2.0
     >>> genlag(china_gdp, 1, 2, -1, na='keep')
            gdp  gdp_lag1  gdp_lag2  gdp_next1
     2007   3.6       NaN       NaN        4.6
@@ -58,30 +81,38 @@ def genlag(x, *args, column=0, inplace=True, na='drop'):
 
     if isinstance(x, pd.Series):
         df = pd.DataFrame(x) if inplace else pd.DataFrame(index=x.index)
-        s = x
+        series = [x]
     elif isinstance(x, pd.DataFrame):
-        if isinstance(column, int):
-            s = x.iloc[:, column]
-        else:
-            s = x.loc[:, column]
+        series = []
+        for c in (column if isinstance(column, list) else [column]):
+            if isinstance(c, int):
+                series.append(x.iloc[:, c])
+            else:
+                series.append(x.loc[:, c])
         df = x if inplace else pd.DataFrame(index=x.index)
     else:
         try:
             x = pd.Series(x)
         except Exception:
             x = pd.DataFrame(x)
-        return genlag(x, *args, column=column, inplace=inplace, na=na)
+        return genlag(x, *args, column=column, by=by, inplace=inplace,
+                      na=na)
+
+    colnames = [_colname(s.name, i) for s in series for i in args]
+    for i, colname in enumerate(colnames):
+        if colname in df.columns or colname in colnames[:i]:
+            raise ValueError('cannot insert %s, already exists' % colname)
 
-    for i in args:
-        if i > 0:
-            colname = 'lag' + str(i)
-        elif i < 0:
-            colname = 'next' + str(-i)
+    # all new columns at once, rather than one df.insert per lag
+    if len(args) > 0:
+        groups = None if by is None else _groups(x, by)
+        lagged = _lagframe(series, args, colnames, groups)
+        if df is x:
+            # setting the columns on x would add them one at a time, a
+            # block each, so join them once and take that over into x
+            df._update_inplace(pd.concat([df, lagged], axis=1))
         else:
-            colname = 'now'
-        if s.name is not None:
-            colname = str(s.name) + '_' + colname
-        df.insert(len(df.columns), colname, s.shift(i))
+            df = pd.concat([df, lagged], axis=1)
 
     if na == 'drop':
         df.dropna(inplace=True)
@@ -95,6 +126,320 @@ def genlag(x, *args, column=0, inplace=True, na='drop'):
     return df
 
 
+def genlag_file(src, dst, *args, column=0, inplace=True, na='drop',
+                chunksize=100000, **kwargs):
+    '''
+    Generates lagged or future values for a time series in a file too large
+    to fit in memory, a chunk at a time.
+
+    Parameters
+    ----------
+    src, dst : str
+        Input and output files. Parquet if the name ends with .parquet or
+        .pq (needs pyarrow), CSV otherwise.
+
+    *args, column, inplace, na :
+        Same as genlag.
+
+    chunksize : int (default: 100000)
+        Number of rows to read at a time.
+
+    **kwargs :
+        Passed to pandas.read_csv for CSV input.
+
+    The output is the same as writing genlag over the whole file, e.g.
+        genlag(pd.read_csv(src), *args).to_csv(dst, index=False)
+    provided that each column parses to the same dtype in every chunk; pass
+    dtype= for integer columns that may contain gaps. Each chunk carries
+    over the last max(lag) rows before it, for lags, and holds back its last
+    max(-lag) rows until the next chunk, for future values, so memory is
+    bounded by the chunk size rather than the file size.
+    '''
+
+    if na not in {'drop', 'keep', 'fill'}:
+        raise ValueError('na must be \'drop\', \'keep\', or \'fill\'')
+    past = max(max(args, default=0), 0)
+    future = max(-min(args, default=0), 0)
+
+    def emit(block, start, stop):
+        # a shallow copy, so that the new columns stay out of the carry
+        df = genlag(block.copy(deep=False), *args, column=column,
+                    inplace=inplace, na='keep')
+        df = df.iloc[start:stop]
+        if na == 'drop':
+            df = df.dropna()
+        elif na == 'fill':
+            df = df.fillna(0)
+        writer(df)
+
+    reader, writer, close = _chunk_io(src, dst, chunksize, kwargs)
+    try:
+        carry = None   # last past + future rows read so far
+        done = 0       # how many rows of carry are already written
+        offset = 0     # rows read so far, for a running index
+        for chunk in reader:
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            block = chunk if carry is None else pd.concat([carry, chunk])
+            stop = max(done, len(block) - future)
+            emit(block, done, stop)
+            carry = block.iloc[len(block) - min(len(block), past + future):]
+            done = len(carry) - (len(block) - stop)
+        if carry is not None and done < len(carry):
+            emit(carry, done, len(carry))
+    finally:
+        close()
+
+
+def lagview(x, *args, column=0, na='keep', frame=False):
+    '''
+    Lagged or future values for a time series as a read-only 2-D view,
+    one column per lag in the order of args, without copying per lag.
+
+    Parameters
+    ----------
+    x, *args, column :
+        Same as genlag, for a single column.
+
+    na : str (default: 'keep')
+        - 'drop'
+                keep only the rows where every lag exists, as a view
+                straight over the data of x, with no copy at all
+        - 'keep'
+                pad with NaN, over one padded copy of the series
+        - 'fill'
+                pad with zeros, over one padded copy of the series
+
+    frame : bool (default: False)
+        If True, copy the view into a DataFrame named like genlag does.
+
+    Returns
+    -------
+    ndarray view, or DataFrame if frame is True
+
+    When args are evenly spaced, like 1, 2, 3, ..., the view is strided in
+    both directions, so memory stays O(n) however many lags there are.
+    Otherwise the columns have to be gathered into an (n, len(args)) array.
+    Only the edges count as missing for 'drop': NaN already in x stays.
+
+    Examples
+    --------
+    >>> lagview([0, 1, 2, 3, 4], 1, 2)
+    array([[nan, nan],
+           [ 0., nan],
+           [ 1.,  0.],
+           [ 2.,  1.],
+           [ 3.,  2.]])
+    >>> lagview([0, 1, 2, 3, 4], 0, 1, -1, na='drop', frame=True)
+       now  lag1  next1
+    1    1     0      2
+    2    2     1      3
+    3    3     2      4
+    '''
+
+    if isinstance(x, pd.DataFrame):
+        s = x.iloc[:, column] if isinstance(column, int) else x.loc[:, column]
+    else:
+        s = x if isinstance(x, pd.Series) else pd.Series(x)
+    if na not in {'drop', 'keep', 'fill'}:
+        raise ValueError('na must be \'drop\', \'keep\', or \'fill\'')
+    if len(args) == 0:
+        raise ValueError('at least one lag is needed')
+
+    v = s.to_numpy()
+    n, k = len(v), len(args)
+    past = max(max(args), 0)
+    future = max(-min(args), 0)
+    if na == 'drop':
+        # row r of the result is row past + r of x, and needs no padding
+        rows = max(n - past - future, 0)
+        start = past
+        index = s.index[past:past + rows]
+    else:
+        if v.dtype.kind in 'iu' or v.dtype.kind == 'b':
+            v = v.astype(np.float64)
+        padded = np.full(n + past + future, np.nan if na == 'keep' else 0,
+                         dtype=v.dtype)
+        padded[past:past + n] = v
+        v = padded
+        rows, start, index = n, past, s.index
+
+    steps = set(b - a for a, b in zip(args, args[1:]))
+    if len(steps) <= 1:
+        step = steps.pop() if steps else 0
+        # element (r, c) is v[start + r - args[0] - c * step]
+        view = np.lib.stride_tricks.as_strided(
+            v[start - args[0]:], shape=(rows, k),
+            strides=(v.strides[0], -step * v.strides[0]), writeable=False)
+    else:
+        view = v[start + np.arange(rows)[:, None] - np.array(args)]
+        view.flags.writeable = False
+
+    if frame:
+        return pd.DataFrame(view, index=index,
+                            columns=[_colname(s.name, i) for i in args])
+    return view
+
+
+def _chunk_io(src, dst, chunksize, kwargs):
+    '''
+    Returns (reader, writer, close) for chunked reading of src and
+    incremental writing of dst.
+    '''
+    def is_parquet(name):
+        return os.path.splitext(name)[1].lower() in {'.parquet', '.pq'}
+
+    if is_parquet(src):
+        import pyarrow.parquet as pq
+        reader = (b.to_pandas() for b in
+                  pq.ParquetFile(src).iter_batches(batch_size=chunksize))
+    else:
+        reader = pd.read_csv(src, chunksize=chunksize, **kwargs)
+
+    if is_parquet(dst):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        state = {}
+
+        def writer(df):
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if 'w' not in state:
+                state['w'] = pq.ParquetWriter(dst, table.schema)
+            state['w'].write_table(table.cast(state['w'].schema))
+
+        def close():
+            if 'w' in state:
+                state['w'].close()
+    else:
+        out = open(dst, 'w', newline='')
+        state = {'header': True}
+
+        def writer(df):
+            # an empty frame still writes the header, as to_csv would
+            if len(df) > 0 or state['header']:
+                df.to_csv(out, index=False, header=state['header'])
+                state['header'] = False
+
+        close = out.close
+    return reader, writer, close
+
+
+def _colname(name, i):
+    '''
+    Column name for lag i of a series named name: lag1, now, next1, ...
+    '''
+    if i > 0:
+        colname = 'lag' + str(i)
+    elif i < 0:
+        colname = 'next' + str(-i)
+    else:
+        colname = 'now'
+    if name is not None:
+        colname = str(name) + '_' + colname
+    return colname
+
+
+def _shift_into(out, v, i):
+    '''
+    Writes v shifted by i periods into out, padding with NaN.
+    '''
+    n = len(v)
+    if abs(i) >= n:
+        out[:] = np.nan
+    elif i > 0:
+        out[:i] = np.nan
+        out[i:] = v[:n - i]
+    elif i < 0:
+        out[:n + i] = v[-i:]
+        out[n + i:] = np.nan
+    else:
+        out[:] = v
+
+
+def _groups(x, by):
+    '''
+    Group boundaries of x by key, as (codes, order, pos, size): group codes,
+    the stable permutation that makes groups contiguous (None if they are
+    already), and the position within the group and the group size of each
+    row in that contiguous order.
+    '''
+    codes = x.groupby(by, sort=False, dropna=False).ngroup().to_numpy()
+    n = len(codes)
+    # codes follow first appearance, so contiguous groups never go down
+    if n > 0 and (codes[1:] < codes[:-1]).any():
+        order = np.argsort(codes, kind='stable')
+        c = codes[order]
+    else:
+        order = None
+        c = codes
+    starts = np.flatnonzero(np.r_[True, c[1:] != c[:-1]]) if n > 0 \
+        else np.empty(0, dtype=np.intp)
+    sizes = np.diff(np.r_[starts, n])
+    pos = np.arange(n) - np.repeat(starts, sizes)
+    size = np.repeat(sizes, sizes)
+    return codes, order, pos, size
+
+
+def _lagframe(series, args, colnames, groups=None):
+    '''
+    DataFrame of each series shifted by each of args, within groups if any,
+    same as s.shift(i) or s.groupby(codes).shift(i) side by side.
+    '''
+    dtypes = [s.dtype for s in series]
+    if not all(isinstance(d, np.dtype) and d.kind in 'iuf' for d in dtypes):
+        # no NaN-able numpy buffer for some dtype, let pandas decide
+        shifted = []
+        for s in series:
+            g = s if groups is None else s.groupby(groups[0])
+            shifted.extend(g.shift(i) for i in args)
+        return pd.concat([y.rename(c) for y, c in zip(shifted, colnames)],
+                         axis=1)
+
+    n, k = len(series[0]), len(args)
+    results = {d if d.kind == 'f' else np.dtype(np.float64) for d in dtypes}
+    if len(results) > 1:
+        # one buffer per series, so that each keeps the dtype of s.shift(i)
+        return pd.concat([_lagframe([s], args, colnames[j * k:(j + 1) * k],
+                                    groups)
+                          for j, s in enumerate(series)], axis=1)
+
+    # one column-major buffer, so that each column is contiguous and the
+    # DataFrame below wraps it as a single block without copying
+    dtype = results.pop()
+    buf = np.empty((n, len(series) * k), dtype=dtype, order='F')
+    if groups is not None:
+        _, order, pos, size = groups
+        tmp = None if order is None else np.empty(n, dtype=dtype)
+    for j, s in enumerate(series):
+        v = s.to_numpy()
+        if groups is not None and order is not None:
+            v = v[order]
+        for m, i in enumerate(args):
+            col = buf[:, j * k + m]
+            if groups is None:
+                _shift_into(col, v, i)
+                continue
+            # shift over contiguous groups, then blank out what crossed over
+            out = col if order is None else tmp
+            _shift_into(out, v, i)
+            if i > 0:
+                out[pos < i] = np.nan
+            elif i < 0:
+                out[pos >= size + i] = np.nan
+            if order is not None:
+                col[order] = out
+    lagged = pd.DataFrame(buf, index=series[0].index, columns=colnames,
+                          copy=False)
+
+    # s.shift(0) keeps an integer dtype
+    if 0 in args:
+        for j, s in enumerate(series):
+            if s.dtype != dtype:
+                now = colnames[j * k + args.index(0)]
+                lagged[now] = lagged[now].astype(s.dtype)
+    return lagged
+
+
 if __name__ == '__main__':
     # for doctest
     china_gdp = pd.Series([3.6, 4.6, 5.1, 6.1, 7.6,
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark of calls through @lazy against calls to the plain function.
+
+Usage: python bench.py
+"""
+
+import timeit
+
+from lazy import lazy
+
+
+def f(x, y, population_size=1000, parsimony_coefficient=0.01):
+    return x
+
+
+g = lazy(f)
+h = lazy(codegen=True)(f)
+
+CALLS = [
+    ('plain function, complete names',
+     'f(1, 2, population_size=10, parsimony_coefficient=0.1)'),
+    ('@lazy, complete names',
+     'g(1, 2, population_size=10, parsimony_coefficient=0.1)'),
+    ('@lazy, partial names', 'g(1, 2, po=10, pa=0.1)'),
+    ('@lazy(codegen=True), complete names',
+     'h(1, 2, population_size=10, parsimony_coefficient=0.1)'),
+    ('@lazy(codegen=True), partial names', 'h(1, 2, po=10, pa=0.1)'),
+    ('plain function, positional only', 'f(1, 2)'),
+    ('@lazy, positional only', 'g(1, 2)'),
+    ('@lazy(codegen=True), positional only', 'h(1, 2)'),
+]
+
+
+if __name__ == '__main__':
+    n = 10 ** 6
+    base = None
+    times = {}
+    for label, stmt in CALLS:
+        t = min(timeit.repeat(stmt, globals=globals(), number=n, repeat=5))
+        ns = times[stmt] = t / n * 1e9
+        if stmt.startswith('f('):
+            base = ns
+        print('%-40s %8.1f ns  (%+.0f%%)' % (label, ns, (ns / base - 1) * 100))
+    # codegen should be no slower than @lazy, partial names included
+    print('%-40s %8.2f x' % ('codegen / @lazy, partial names',
+                             times['h(1, 2, po=10, pa=0.1)'] /
+                             times['g(1, 2, po=10, pa=0.1)']))
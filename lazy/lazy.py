@@ -49,13 +49,13 @@ def _partial_matching(p, names):
     | 3. Ambiguous match      | -1 | candidate complete names |
     Doctest
     -------
-    # Unambiguous match
+    >>> # Unambiguous match
     >>> _partial_matching('pa', {'population_size', 'parsimony_coefficient'})
     (1, 'parsimony_coefficient')
-    # No match
+    >>> # No match
     >>> _partial_matching('pe', {'population_size', 'parsimony_coefficient'})
     (0, None)
-    # Ambiguous match
+    >>> # Ambiguous match
     >>> names = {'population_size', 'parsimony_coefficient'}
     >>> m, c = _partial_matching('p', names)
     >>> m == -1
@@ -75,19 +75,98 @@ def _partial_matching(p, names):
     return (m, c)
 
 
-def lazy(f):
+def _prefix_table(names):
+    '''
+    Maps every prefix of every name to the result of _partial_matching,
+    so that matching a partial name is a single dict lookup. A complete
+    name always matches itself, even if it starts another name, as in R.
+
+    Doctest
+    -------
+    >>> table = _prefix_table(['population_size', 'parsimony_coefficient'])
+    >>> table['pa']
+    (1, 'parsimony_coefficient')
+    >>> table['p']
+    (-1, ['population_size', 'parsimony_coefficient'])
+    >>> 'pe' in table
+    False
+    >>> _prefix_table(['x', 'xlim'])['x']
+    (1, 'x')
+    '''
+
+    candidates = {}
+    for name in names:
+        for i in range(1, len(name) + 1):
+            candidates.setdefault(name[:i], []).append(name)
+    table = {p: (1, c[0]) if len(c) == 1 else (-1, c)
+             for p, c in candidates.items()}
+    table.update((name, (1, name)) for name in names)
+    return table
+
+
+def _resolver(names, forward=False):
+    '''
+    Returns resolve(shape), which maps a tuple of partial names to the
+    tuple of complete names, memoized per shape. If forward is True, names
+    that match nothing are kept as they are, for **kwargs; shapes with such
+    names are not memoized, as the keys forwarded can be anything.
+    '''
+
+    table = _prefix_table(names)
+    shapes = {}  # tuple of partial names ==> tuple of complete names
+
+    def match(shape):
+        complete = []
+        for p in shape:
+            m, c = table.get(p, (0, p if forward else None))
+            if m == 0 and not forward:
+                raise LookupError("No match for parameter name "
+                                  "that starts with '%s'.\n"
+                                  "Legal parameter name(s): %s"
+                                  % (p, str(names)))
+            elif m == -1:
+                raise LookupError("Ambiguous match for parameter name "
+                                  "that starts with '%s'.\n"
+                                  "Candidate parameter names: %s"
+                                  % (p, str(c)))
+            complete.append(c)
+        return tuple(complete)
+
+    def resolve(shape):
+        try:
+            return shapes[shape]
+        except KeyError:
+            complete = match(shape)
+            if not forward or all(p in table for p in shape):
+                shapes[shape] = complete
+            return complete
+    return resolve
+
+
+def lazy(f=None, *, codegen=False):
     '''
     A decorator that allows partial matching in function parameter names, like in R
     Essentially, it performs the conversion:
         f(*a, **partial) ==> f(*a, **complete)
     Parameter
     ---------
-    f : function
-        original function
+    f : function or class
+        original function, or any callable inspect.signature understands,
+        such as a bound method or a functools.partial; for a class, its
+        __init__ and public methods are decorated in place
+    codegen : bool (default: False)
+        if True, as in @lazy(codegen=True), generate a wrapper with the same
+        parameters as f, so that calls with complete names bind directly and
+        cost little more than calling f
     Returns
     -------
     g : function
         converts f(*a, **partial) ==> f(*a, **complete)
+    Notes
+    -----
+    Only parameters that can be passed by keyword take part in matching.
+    If f has **kwargs, names that match no parameter are passed on to it,
+    while ambiguous names are still an error.
     Doctest
     -------
     Consider decorating a function f:
@@ -116,34 +195,210 @@ def lazy(f):
         ...
     LookupError: Ambiguous match for parameter name that starts with 'p'.
     Candidate parameter names: ['population_size', 'parsimony_coefficient']
+    >>> @lazy(codegen=True)
+    ... def h(x, y=2, *, scale=1.0):
+    ...    return (x + y) * scale
+    >>> h(1, sc=10)
+    30
+    >>> h(1, y=3, scale=2)
+    8
+    >>> @lazy
+    ... class Model(object):
+    ...    def __init__(self, learning_rate=0.1, **options):
+    ...        self.learning_rate, self.options = learning_rate, options
+    ...    def fit(self, data, max_iterations=100):
+    ...        return max_iterations
+    >>> m = Model(le=0.5, verbose=True)
+    >>> m.learning_rate, m.options
+    (0.5, {'verbose': True})
+    >>> m.fit([], max_=10)
+    10
+    '''
+
+    if f is None:
+        return lambda f: lazy(f, codegen=codegen)
+    if isinstance(f, type):
+        return _lazy_class(f, codegen)
+    return _lazy_function(f, codegen)
+
+
+def _lazy_class(cls, codegen):
+    '''
+    Decorates __init__ and the public methods of cls in place, with their
+    signatures resolved once, here
     '''
 
-    spec = inspect.getfullargspec(f)
-    # if there is **kwargs in function signature, then lazy call is disabled
-    if spec.varkw is not None:
-        return f
+    for name, attr in list(vars(cls).items()):
+        if name != '__init__' and name.startswith('_'):
+            continue
+        if isinstance(attr, staticmethod):
+            attr = staticmethod(_lazy_function(attr.__func__, codegen))
+        elif isinstance(attr, classmethod):
+            attr = classmethod(_lazy_function(attr.__func__, codegen,
+                                              method=True))
+        elif inspect.isfunction(attr):
+            attr = _lazy_function(attr, codegen, method=True)
+        else:
+            continue
+        setattr(cls, name, attr)
+    return cls
+
+
+def _lazy_function(f, codegen, method=False):
+    sig = inspect.signature(f)
+    params = list(sig.parameters.values())
+    # self or cls is never passed by name
+    positional = (inspect.Parameter.POSITIONAL_ONLY,
+                  inspect.Parameter.POSITIONAL_OR_KEYWORD)
+    if method and params and params[0].kind in positional:
+        first, params = params[0], params[1:]
+    else:
+        first = None
+    kinds = {p.kind for p in params}
+    names = [p.name for p in params
+             if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)]
+    varkw = inspect.Parameter.VAR_KEYWORD in kinds
+
+    # resolved once here, rather than on every call
+    resolve = _resolver(names, forward=varkw)
+    if codegen and not varkw and inspect.isfunction(f) and \
+            inspect.Parameter.POSITIONAL_ONLY not in kinds:
+        g = _codegen(f, ([first] if first else []) + params, resolve)
+        if g is not None:
+            return g
+    exact = frozenset(names)
 
     @wraps(f)
     def g(*a, **partial):
-        complete = {}
-        names = spec.args + spec.kwonlyargs
-        for p in partial:
-            m, c = _partial_matching(p, names)
-            if m == 0:
-                raise LookupError("No match for parameter name "
-                                  "that starts with '%s'.\n"
-                                  "Legal parameter name(s): %s"
-                                  % (p, str(names)))
-            elif m == -1:
-                raise LookupError("Ambiguous match for parameter name "
-                                  "that starts with '%s'.\n"
-                                  "Candidate parameter names: %s"
-                                  % (p, str(c)))
-            complete[c] = partial[p]
-        return f(*a, **complete)
+        # most calls spell every name out in full
+        if exact.issuperset(partial):
+            return f(*a, **partial)
+        complete = resolve(tuple(partial))
+        return f(*a, **dict(zip(complete, partial.values())))
     return g
 
 
+_MISSING = object()   # default in generated wrappers, for "not passed"
+
+_TEMPLATE = '''
+def make(_lazy_f, _lazy_callers, _lazy_caller, _lazy_defaults,
+         _lazy_missing):
+    %(unpack)s
+    def %(name)s(%(params)s):
+        if %(check)s:
+            try:
+                _lazy_call = _lazy_callers[tuple(_lazy_partial)]
+            except KeyError:
+                _lazy_call = _lazy_caller(tuple(_lazy_partial))
+            return _lazy_call(%(varargs)s, %(names)s_lazy_partial)
+        return _lazy_f(%(call)s)
+    return %(name)s
+'''
+
+# called by the wrapper above for one shape of partial names
+_CALLER = '''
+def make(_lazy_f, _lazy_fallback, _lazy_defaults, _lazy_missing):
+    %(unpack)s
+    def _lazy_call(_lazy_varargs, %(names)s_lazy_partial):
+        if %(check)s:
+            return _lazy_fallback(_lazy_varargs, (%(names)s), _lazy_partial)
+        return _lazy_f(%(call)s)
+    return _lazy_call
+'''
+
+
+def _codegen(f, params, resolve):
+    '''
+    Generates a wrapper whose parameters are those of f, plus **partial for
+    names still to be resolved. Returns None if f cannot be wrapped so.
+
+    Every parameter defaults to _MISSING in the wrapper, so that it can
+    tell a value passed from one left out, even if equal to the default;
+    those left out are given the defaults of f on the way. Calls with
+    partial names go through a caller generated for their shape, the
+    first time it is seen, that puts each value in its place; a shape
+    only gets there if all its names resolve, so there are only so many.
+    '''
+
+    args = [p.name for p in params if p.kind == p.POSITIONAL_OR_KEYWORD]
+    kwonlyargs = [p.name for p in params if p.kind == p.KEYWORD_ONLY]
+    varargs = [p.name for p in params if p.kind == p.VAR_POSITIONAL]
+    names = args + kwonlyargs
+    if any(x.startswith('_lazy_') for x in names) or \
+            not f.__name__.isidentifier():
+        return None
+
+    defaults = {p.name: p.default for p in params
+                if p.default is not p.empty}
+    required = [x for x in names if x not in defaults]
+    unpack = '; '.join('_lazy_d_%s = _lazy_defaults[%r]' % (x, x)
+                       for x in defaults) or 'pass'
+
+    def call(given):
+        # the arguments to f, with given mapping names to partial names
+        def value(x):
+            if x in given:
+                return '_lazy_partial[%r]' % given[x]
+            if x not in defaults:
+                return x
+            return '(%s if %s is not _lazy_missing else _lazy_d_%s)' % (
+                x, x, x)
+        values = [value(x) for x in args]
+        if varargs:
+            values.append('*_lazy_varargs')
+        return ', '.join(values + ['%s=%s' % (x, value(x))
+                                   for x in kwonlyargs])
+
+    params = ['%s=_lazy_missing' % x for x in args]
+    if varargs:
+        params.append('*_lazy_varargs')
+    elif kwonlyargs:
+        params.append('*')
+    params += ['%s=_lazy_missing' % x for x in kwonlyargs]
+    params.append('**_lazy_partial')
+    source = _TEMPLATE % {
+        'name': f.__name__, 'params': ', '.join(params), 'unpack': unpack,
+        'check': ' or '.join(['_lazy_partial'] +
+                             ['%s is _lazy_missing' % x for x in required]),
+        'varargs': '_lazy_varargs' if varargs else '()',
+        'names': ''.join(x + ', ' for x in names), 'call': call({})}
+    callers = {}  # tuple of partial names ==> caller
+
+    def caller(shape):
+        complete = resolve(shape)
+        for i, x in enumerate(complete):
+            if x in complete[:i]:
+                raise TypeError("%s() got multiple values for argument '%s'"
+                                % (f.__name__, x))
+        given = dict(zip(complete, shape))
+        # anything out of the ordinary is left to fallback, and to f
+        check = ' or '.join(['%s is not _lazy_missing' % x for x in given] +
+                            ['%s is _lazy_missing' % x for x in required
+                             if x not in given]) or 'False'
+        namespace = {}
+        exec(_CALLER % {'unpack': unpack,
+                        'names': ''.join(x + ', ' for x in names),
+                        'check': check, 'call': call(given)}, namespace)
+        c = callers[shape] = namespace['make'](f, fallback, defaults,
+                                               _MISSING)
+        return c
+
+    def fallback(varargs, values, partial):
+        # pass f only what was given, so that it raises the error it would
+        given = dict(zip(resolve(tuple(partial)), partial.values()))
+        if varargs:
+            return f(*values[:len(args)], *varargs,
+                     **{x: v for x, v in zip(kwonlyargs, values[len(args):])
+                        if v is not _MISSING}, **given)
+        return f(**{x: v for x, v in zip(names, values)
+                    if v is not _MISSING}, **given)
+
+    namespace = {}
+    exec(source, namespace)
+    g = namespace['make'](f, callers, caller, defaults, _MISSING)
+    return wraps(f)(g)
+
+
 if __name__ == '__main__':
     import doctest
-doctest.testmod()
\ No newline at end of file
+    doctest.testmod()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the max drawdown engines.
+
+Usage: python bench.py [largest power of 10, default 8]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from mdd import mdd, rolling_mdd
+
+
+def timeit(f, *a, **kw):
+    t = time.perf_counter()
+    f(*a, **kw)
+    return time.perf_counter() - t
+
+
+def naive_rolling_mdd(p, window):
+    m = np.full(len(p), np.nan)
+    for t in range(window - 1, len(p)):
+        x = p[t - window + 1:t + 1]
+        m[t] = np.max(np.maximum.accumulate(x) - x)
+    return m
+
+
+if __name__ == '__main__':
+    top = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+
+    print('Expanding window')
+    print('%12s %12s %12s' % ('n', 'python (s)', 'numpy (s)'))
+    for k in range(3, top + 1):
+        p = np.random.randn(10 ** k).cumsum() + 10 ** k
+        # the python loop is not worth waiting for beyond 1e6 points
+        t_py = timeit(mdd, p) if k <= 6 else float('nan')
+        t_np = timeit(mdd, p, engine='numpy')
+        print('%12d %12.4f %12.4f' % (10 ** k, t_py, t_np))
+
+    print('\nRolling window, n = 100000')
+    print('%12s %12s %12s' % ('window', 'naive (s)', 'queue (s)'))
+    p = np.random.randn(10 ** 5).cumsum() + 10 ** 5
+    for w in (10, 250, 2500):
+        print('%12d %12.4f %12.4f' % (w, timeit(naive_rolling_mdd, p, w),
+                                      timeit(rolling_mdd, p, w)))
@@ -6,11 +6,61 @@ Max Drawdown (MDD)
 """
 # Date: 18/06/26 = Tue
 
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
 
 
-def mdd(p):
+Drawdowns = namedtuple('Drawdowns', ['drawdown', 'mdd', 'duration',
+                                     'recovery'])
+
+
+def mdd(p, engine='python'):
+    '''
+    Running max drawdown of a price series.
+
+    Parameters
+    ----------
+    p : sequence or ndarray
+        price series
+
+    engine : str (default: 'python')
+        - 'python'
+                plain loop, returns a list of running max drawdowns
+        - 'numpy'
+                vectorized, returns (m, peak, trough), where m is a float64
+                ndarray of running max drawdowns, and peak, trough are the
+                indices where the max drawdown starts and bottoms out; peak
+                is -1 if the max drawdown starts from the peak of 0 that
+                both engines start from, as when prices are all below 0
+
+    Both engines start the peak from 0 and skip NaN prices, so they agree
+    element by element.
+
+    Examples
+    --------
+    >>> mdd([1, 3, 2, 5, 1, 4])
+    [0, 0, 1, 1, 4, 4]
+    >>> m, peak, trough = mdd([1, 3, 2, 5, 1, 4], engine='numpy')
+    >>> m
+    array([0., 0., 1., 1., 4., 4.])
+    >>> peak, trough
+    (3, 4)
+    >>> m, peak, trough = mdd([-5, -3, -8], engine='numpy')
+    >>> m
+    array([5., 5., 8.])
+    >>> peak, trough
+    (-1, 2)
+    '''
+
+    if engine == 'numpy':
+        return _mdd_numpy(p)
+    elif engine != 'python':
+        raise ValueError('engine must be \'python\' or \'numpy\'')
+
     m = []
     peak = 0
     mdd_so_far = 0
@@ -23,7 +73,303 @@ def mdd(p):
     return m
 
 
+def _running_peak(p, axis=0):
+    '''
+    Running peak of p along axis, starting from 0 and skipping NaN.
+    '''
+    peak = np.fmax.accumulate(p, axis=axis)
+    return np.fmax(peak, 0, out=peak)
+
+
+def _mdd_numpy(p):
+    p = np.asarray(p, dtype=np.float64)
+    if len(p) == 0:
+        return np.empty(0), -1, -1
+    # drawdown from the running peak, then its running max
+    dd = _running_peak(p)
+    np.subtract(dd, p, out=dd)
+    trough = int(np.nanargmax(dd)) if not np.isnan(dd).all() else 0
+    m = np.fmax.accumulate(dd)
+    np.fmax(m, 0, out=m)
+    # the loop keeps the first peak and the first trough, so does argmax;
+    # no price is the peak if they are all below the starting peak of 0
+    peak = trough
+    if m[-1] > 0:
+        peak = int(np.nanargmax(p[:trough + 1]))
+        if p[peak] < 0:
+            peak = -1
+    return m, peak, trough
+
+
+def drawdowns(p, processes=None):
+    '''
+    Drawdown statistics for many price series at once, one per column.
+
+    Parameters
+    ----------
+    p : 2-D ndarray or DataFrame
+        prices, time x assets
+
+    processes : int or None (default: None)
+        if more than 1, split the columns across a pool of that many
+        processes
+
+    Returns
+    -------
+    Drawdowns(drawdown, mdd, duration, recovery)
+        - drawdown
+                running drawdown from the running peak, time x assets
+        - mdd
+                max drawdown of each column
+        - duration
+                longest stretch of bars spent below the running peak
+        - recovery
+                bars from the max drawdown trough until the price gets back
+                to the peak it fell from, NaN if it never does
+
+    For a DataFrame, drawdown is a DataFrame and the rest are Series indexed
+    by its columns; otherwise they are ndarrays.
+
+    Examples
+    --------
+    >>> p = np.array([[1, 5], [3, 4], [2, 3], [5, 6], [1, 2]])
+    >>> r = drawdowns(p)
+    >>> r.mdd
+    array([4., 4.])
+    >>> r.duration
+    array([1, 2])
+    >>> r.recovery
+    array([nan, nan])
+    '''
+
+    values = np.asarray(p, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    if processes is not None and processes > 1 and values.shape[1] > 1:
+        blocks = np.array_split(values, min(processes, values.shape[1]),
+                                axis=1)
+        with ProcessPoolExecutor(processes) as pool:
+            parts = list(pool.map(_drawdowns, blocks))
+        result = Drawdowns(*(np.concatenate(x, axis=-1)
+                             for x in zip(*parts)))
+    else:
+        result = _drawdowns(values)
+
+    if isinstance(p, pd.DataFrame):
+        result = Drawdowns(
+            pd.DataFrame(result.drawdown, index=p.index, columns=p.columns),
+            *(pd.Series(x, index=p.columns) for x in result[1:]))
+    return result
+
+
+def _drawdowns(p):
+    n = len(p)
+    t = np.arange(n)[:, None]
+    peak = _running_peak(p)
+    dd = peak - p
+    m = np.fmax.reduce(dd, axis=0, initial=0)
+
+    # bars since the last time at the running peak, -1 if never at a peak
+    last_peak = np.maximum.accumulate(np.where(dd == 0, t, -1), axis=0)
+    duration = (t - last_peak).max(axis=0, initial=0)
+
+    # first bar after the trough where the price is back to the old peak
+    if n == 0:
+        return Drawdowns(dd, m, m.astype(int), m)
+    trough = np.argmax(np.where(np.isnan(dd), -np.inf, dd), axis=0)
+    cols = np.arange(p.shape[1])
+    back = (t > trough) & (p >= peak[trough, cols])
+    recovery = np.where(back.any(axis=0),
+                        back.argmax(axis=0) - trough, np.nan)
+    recovery[m == 0] = 0
+    return Drawdowns(dd, m, duration, recovery)
+
+
+def rolling_mdd(p, window, min_periods=None):
+    '''
+    Max drawdown within a trailing window, in amortized O(n).
+
+    Parameters
+    ----------
+    p : sequence or ndarray or Series
+        price series
+
+    window : int or str or Timedelta
+        number of bars, or for a Series with a DatetimeIndex, a time span
+        like '30D', covering (t - window, t] as in pandas
+
+    min_periods : int or None (default: None)
+        least number of prices needed in a window, otherwise NaN;
+        defaults to window for a number of bars, and 1 for a time span
+
+    Returns
+    -------
+    ndarray, or Series with the same index if p is a Series
+
+    The window slides as a queue built on two stacks: the back stack keeps
+    a running (max, min, mdd) of the newest prices, and the front stack
+    keeps the same aggregates for each suffix of the oldest ones, so that
+    pushing, popping and querying all take amortized O(1). NaN prices are
+    skipped, but still take up their place in a window of bars.
+
+    Examples
+    --------
+    >>> rolling_mdd([1, 3, 2, 5, 1, 4], 3)
+    array([nan, nan,  1.,  1.,  4.,  4.])
+    >>> s = pd.Series([1, 3, 2, 5, 1, 4],
+    ...               index=pd.date_range('2018-06-26', periods=6))
+    >>> rolling_mdd(s, '2D').tolist()
+    [0.0, 0.0, 1.0, 0.0, 4.0, 0.0]
+    '''
+
+    if isinstance(p, pd.Series):
+        values = p.to_numpy(dtype=np.float64)
+        if isinstance(window, (int, np.integer)):
+            keys = np.arange(len(p))
+        else:
+            if not isinstance(p.index, pd.DatetimeIndex):
+                raise ValueError('a time span window needs a DatetimeIndex')
+            if not p.index.is_monotonic_increasing:
+                raise ValueError('index must be monotonic increasing')
+            keys = p.index.as_unit('ns').asi8
+            window = pd.Timedelta(window).value
+            min_periods = 1 if min_periods is None else min_periods
+        m = _rolling_mdd(values, keys.tolist(), window,
+                         window if min_periods is None else min_periods)
+        return pd.Series(m, index=p.index, name=p.name)
+
+    values = np.asarray(p, dtype=np.float64)
+    return _rolling_mdd(values, range(len(values)), window,
+                        window if min_periods is None else min_periods)
+
+
+def _rolling_mdd(values, keys, window, min_periods):
+    out = np.full(len(values), np.nan)
+    front = []   # (key, max, min, mdd) of each suffix, oldest on top
+    back = []    # (key, price), oldest first
+    b_max, b_min, b_mdd = -np.inf, np.inf, 0.0
+
+    for t, (k, x) in enumerate(zip(keys, values.tolist())):
+        # push
+        if x == x:
+            back.append((k, x))
+            if x > b_max:
+                b_max = x
+            if x < b_min:
+                b_min = x
+            if b_max - x > b_mdd:
+                b_mdd = b_max - x
+
+        # pop whatever has slid out of (k - window, k]
+        lo = k - window
+        while True:
+            if front:
+                if front[-1][0] > lo:
+                    break
+            elif back and back[0][0] <= lo:
+                s_max, s_min, s_mdd = -np.inf, np.inf, 0.0
+                for key, y in reversed(back):
+                    if y - s_min > s_mdd:
+                        s_mdd = y - s_min
+                    if y > s_max:
+                        s_max = y
+                    if y < s_min:
+                        s_min = y
+                    front.append((key, s_max, s_min, s_mdd))
+                back = []
+                b_max, b_min, b_mdd = -np.inf, np.inf, 0.0
+            else:
+                break
+            front.pop()
+
+        # query
+        if len(front) + len(back) >= max(min_periods, 1):
+            if front:
+                _, f_max, _, m = front[-1]
+                if b_mdd > m:
+                    m = b_mdd
+                if f_max - b_min > m:
+                    m = f_max - b_min
+            else:
+                m = b_mdd
+            out[t] = m
+    return out
+
+
+class DrawdownTracker(object):
+    '''
+    Incremental max drawdown of a live price feed, in O(1) memory.
+
+    Feeding it a series, one price or one array at a time, gives exactly
+    the same running max drawdowns as mdd() over the whole series.
+
+    Examples
+    --------
+    >>> t = DrawdownTracker()
+    >>> t.update(1), t.update(3), t.update(2)
+    (0, 0, 1)
+    >>> state = t.checkpoint()
+    >>> t.update_many([5, 1, 4])
+    array([1., 4., 4.])
+    >>> t = DrawdownTracker.restore(state)
+    >>> t.update_many([5, 1, 4])
+    array([1., 4., 4.])
+    '''
+
+    __slots__ = ('peak', 'drawdown', 'mdd')
+
+    def __init__(self, peak=0, drawdown=0, mdd=0):
+        self.peak = peak
+        self.drawdown = drawdown
+        self.mdd = mdd
+
+    def __repr__(self):
+        return 'DrawdownTracker(peak=%r, drawdown=%r, mdd=%r)' % \
+            self.checkpoint()
+
+    def update(self, price):
+        '''
+        Takes in one price, and returns the max drawdown so far.
+        '''
+        if price > self.peak:
+            self.peak = price
+        self.drawdown = self.peak - price
+        if self.drawdown > self.mdd:
+            self.mdd = self.drawdown
+        return self.mdd
+
+    def update_many(self, prices):
+        '''
+        Takes in an array of prices, and returns the running max drawdowns.
+        '''
+        p = np.asarray(prices, dtype=np.float64)
+        if len(p) == 0:
+            return np.empty(0)
+        peak = np.fmax.accumulate(np.concatenate(([self.peak], p)))[1:]
+        dd = peak - p
+        m = np.fmax.accumulate(np.concatenate(([self.mdd], dd)))[1:]
+        self.peak, self.drawdown, self.mdd = \
+            float(peak[-1]), float(dd[-1]), float(m[-1])
+        return m
+
+    def checkpoint(self):
+        '''
+        Returns the state as a tuple: (peak, drawdown, mdd).
+        '''
+        return self.peak, self.drawdown, self.mdd
+
+    @classmethod
+    def restore(cls, state):
+        '''
+        Rebuilds a tracker from a state returned by checkpoint().
+        '''
+        return cls(*state)
+
+
 if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
     p = np.random.randn(100).cumsum()
     plt.plot(p)
     m = mdd(p)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Latency of a job: a new interpreter for each, as pyMain used to start,
+against a round trip to a worker already running.
+
+Usage: python bench.py [number of jobs, default 100]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from sub import Pool, _run_script
+
+
+def per_job(f, n):
+    t = time.perf_counter()
+    for _ in range(n):
+        f()
+    return (time.perf_counter() - t) / n * 1000
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with tempfile.TemporaryDirectory() as folder:
+        script = os.path.join(folder, 'job.py')
+        with open(script, 'w') as f:
+            f.write('x = sum(range(1000))\n')
+        print('%-24s %8.2f ms' % ('new interpreter', per_job(
+            lambda: subprocess.run([sys.executable, script]), n)))
+        with Pool(1) as pool:
+            print('%-24s %8.2f ms' % ('pool, script', per_job(
+                lambda: pool.submit(_run_script, (script, folder)).result(),
+                n)))
+            print('%-24s %8.2f ms' % ('pool, function', per_job(
+                lambda: pool.submit(sum, (range(1000),)).result(), n)))
@@ -3,14 +3,301 @@
 Created on Wed Jun 27 22:39:41 2018
 
 @author: FL
+
+Jobs run in a pool of Python processes started once and kept alive, so a
+job costs a round trip over a pipe, not the start of an interpreter. Each
+message is a pickle, after its length in 8 bytes. A worker that crashes is
+reaped and started again, and one that takes too long is killed.
 """
 
+from concurrent.futures import Future
+import atexit
+import os
+import pickle
+import queue
+import runpy
+import select
+import struct
 import subprocess
 import sys
+import threading
+import time
+
+
+__all__ = ['pyMain', 'Pool']
+
+
+HEADER = struct.Struct('>Q')   # length of a message
+_SELECT = os.name != 'nt'      # whether select can wait on a pipe
 
 
 def pyMain(x):
-    subprocess.Popen([sys.executable, 'te.py'],
-                     stdout=subprocess.PIPE,
-                     stderr=subprocess.STDOUT)
+    # te.py runs in the background, as before, but in a worker of the pool
+    _pool().submit(_run_script, (os.path.abspath('te.py'), os.getcwd()),
+                   timeout=60)
     return x + 1024
+
+
+class Pool(object):
+    '''
+    A pool of worker processes, each running one job at a time.
+
+    Parameters
+    ----------
+    processes : int or None (default: None)
+        number of workers, None for the number of CPUs
+    timeout : float or None (default: None)
+        seconds a job may take, unless given for the job; None for no limit
+    preload : iterable of str (default: ())
+        modules each worker imports as it starts, to be ready for jobs
+
+    Examples
+    --------
+    >>> with Pool(2) as pool:
+    ...     pool.submit(pow, (2, 10)).result()
+    ...     pool.submit(time.sleep, (5,), timeout=0.5).exception()
+    1024
+    TimeoutError('job took more than 0.5 s')
+    '''
+
+    def __init__(self, processes=None, timeout=None, preload=()):
+        self.timeout = timeout
+        self._jobs = queue.Queue()
+        self._command = [sys.executable, os.path.abspath(__file__),
+                         '--worker'] + list(preload)
+        # so that workers can unpickle whatever this process can
+        self._env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+            [x for x in sys.path if x] +
+            [os.environ.get('PYTHONPATH', '')]))
+        self._threads = []
+        for _ in range(processes or os.cpu_count() or 1):
+            thread = threading.Thread(target=self._dispatch, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, func, args=(), kwargs=None, timeout=None):
+        '''
+        Runs func(*args, **kwargs) in a worker, and returns a Future of its
+        result. func and the arguments must be picklable; timeout, in
+        seconds, overrides that of the pool for this job.
+        '''
+        future = Future()
+        message = pickle.dumps((func, tuple(args), kwargs or {}))
+        self._jobs.put((future, message,
+                        self.timeout if timeout is None else timeout))
+        return future
+
+    def close(self, cancel=False):
+        '''
+        Lets the jobs submitted so far finish, and then stops the workers.
+        If cancel, the jobs not yet started are cancelled instead, so that
+        only those running are waited for.
+        '''
+        while cancel:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job[0].cancel()
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _dispatch(self):
+        worker = _Worker(self._command, self._env)
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+                future, message, timeout = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    ok, result = worker.call(message, timeout)
+                except TimeoutError:
+                    worker.restart()
+                    future.set_exception(TimeoutError(
+                        'job took more than %g s' % timeout))
+                except EOFError:
+                    code = worker.restart()
+                    future.set_exception(RuntimeError(
+                        'worker died with exit code %s' % code))
+                except Exception as e:
+                    # e.g. a reply that does not unpickle here; where the
+                    # stream stands is unknown, so start afresh
+                    worker.restart()
+                    error = RuntimeError('cannot read the reply: %r' % e)
+                    error.__cause__ = e
+                    future.set_exception(error)
+                else:
+                    if ok:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(result)
+        finally:
+            worker.stop()
+
+
+class _Worker(object):
+    '''
+    One worker process, and the pipes to talk to it.
+    '''
+
+    def __init__(self, command, env):
+        self.command = command
+        self.env = env
+        self.start()
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, env=self.env,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+
+    def stop(self, kill=False):
+        '''
+        Stops the worker, and reaps it, so that no zombie is left. Returns
+        its exit code.
+        '''
+        if not kill:
+            # end of input tells the worker to quit
+            self.process.stdin.close()
+            try:
+                self.process.wait(5)
+            except subprocess.TimeoutExpired:
+                kill = True
+        if kill:
+            self.process.kill()
+        for f in (self.process.stdin, self.process.stdout):
+            try:
+                f.close()
+            except OSError:
+                pass
+        return self.process.wait()
+
+    def restart(self):
+        code = self.stop(kill=True)
+        self.start()
+        return code
+
+    def call(self, message, timeout):
+        '''
+        Sends a job, and returns (ok, result) as the worker replies. Raises
+        TimeoutError if there is no reply in time, or EOFError if the
+        worker is gone.
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        timer = None
+        if deadline is not None and not _SELECT:
+            # select cannot wait on a pipe here, so kill the worker in time
+            timer = threading.Timer(timeout, self.process.kill)
+            timer.start()
+            deadline = None
+        try:
+            try:
+                _send(self.process.stdin, message)
+            except (BrokenPipeError, OSError):
+                raise EOFError
+            fd = self.process.stdout.fileno()
+            size, = HEADER.unpack(_read(fd, HEADER.size, deadline))
+            return pickle.loads(_read(fd, size, deadline))
+        except EOFError:
+            if timer is not None and not timer.is_alive():
+                raise TimeoutError
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+
+def _send(f, message):
+    f.write(HEADER.pack(len(message)))
+    f.write(message)
+    f.flush()
+
+
+def _read(fd, n, deadline=None):
+    '''
+    Reads exactly n bytes from file descriptor fd, by the deadline of
+    time.monotonic() if not None. The deadline needs select on pipes, which
+    Windows lacks.
+    '''
+    chunks = []
+    while n > 0:
+        if deadline is not None:
+            left = deadline - time.monotonic()
+            if left <= 0 or not select.select([fd], [], [], left)[0]:
+                raise TimeoutError
+        chunk = os.read(fd, min(n, 1 << 20))
+        if not chunk:
+            raise EOFError
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b''.join(chunks)
+
+
+def _serve(preload):
+    '''
+    The loop of a worker: runs jobs from stdin, and replies on stdout.
+    '''
+    # keep the pipes to the pool for messages only, what jobs print or
+    # read goes to and comes from the null device
+    ipc_in = os.fdopen(os.dup(0), 'rb')
+    ipc_out = os.fdopen(os.dup(1), 'wb')
+    null = os.open(os.devnull, os.O_RDWR)
+    os.dup2(null, 0)
+    os.dup2(null, 1)
+    for name in preload:
+        __import__(name)
+    while True:
+        header = ipc_in.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+        size, = HEADER.unpack(header)
+        try:
+            func, args, kwargs = pickle.loads(ipc_in.read(size))
+            reply = (True, func(*args, **kwargs))
+        except BaseException as e:
+            reply = (False, e)
+        try:
+            message = pickle.dumps(reply)
+        except Exception as e:
+            message = pickle.dumps((False, RuntimeError(
+                'cannot pickle the %s: %r' %
+                ('result' if reply[0] else 'error', e))))
+        _send(ipc_out, message)
+
+
+def _run_script(path, cwd):
+    os.chdir(cwd)
+    runpy.run_path(path, run_name='__main__')
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = Pool()
+            # at exit, wait for the running jobs only, up to their timeout
+            atexit.register(_POOL.close, cancel=True)
+    return _POOL
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--worker']:
+        _serve(sys.argv[2:])
+    else:
+        import doctest
+        doctest.testmod()
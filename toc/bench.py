@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of auto_toc on a large generated markdown file.
+
+Usage: python bench.py [size in MB, default 100]
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from toc import auto_toc
+from catch import disable  # importable once toc is
+
+
+def generate(filename, size):
+    """
+    Writes a markdown file of about size bytes, with a title, a toc
+    header, an old toc, and then sections of text.
+    """
+    paragraph = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit. '
+                 * 8 + '\n\n')
+    with open(filename, 'w', encoding='utf8') as f:
+        f.write('# Title\n\n## Contents\n\n- [Old](#user-content-old)\n\n')
+        i = written = 0
+        while written < size:
+            chunk = '## Section %d\n\n%s### Part %d.1\n\n%s' % (
+                i, paragraph * 20, i, paragraph * 20)
+            f.write(chunk)
+            written += len(chunk)
+            i += 1
+    return i * 2
+
+
+if __name__ == '__main__':
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 100
+    disable()
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'big.md')
+        headers = generate(filename, int(size * 2 ** 20))
+        mb = os.path.getsize(filename) / 2 ** 20
+        # the first run writes a new toc, the second finds it up to date
+        for run in ('update', 'no-op'):
+            with contextlib.redirect_stdout(io.StringIO()):
+                t = time.perf_counter()
+                auto_toc(filename, True, True, None, True)
+                t = time.perf_counter() - t
+            print('%-6s %.1f MB, %d headers: %.2f s, %.1f MB/s'
+                  % (run, mb, headers, t, mb / t))
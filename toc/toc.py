@@ -9,15 +9,33 @@ https://guides.github.com/features/mastering-markdown/
 
 # Author: Fu Lei <lei dot fu at connect dot ust dot hk>
 
-import codecs
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import glob
+import hashlib
+import json
+import os
 import os.path
+import re
 import shutil
+import sys
+import tempfile
+import time
 
-from catch import catch
-from inplace import inplace
+# one @catch for every snippet, from the catch folder next door, looked up
+# last, so that its bench.py does not shadow any other
+_CATCH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, 'catch'))
+if _CATCH not in sys.path:
+    sys.path.append(_CATCH)
 
+from catch import catch, disable, enable, is_enabled  # noqa: E402
 
-__all__ = ['auto_toc']
+
+__all__ = ['auto_toc', 'auto_toc_batch', 'Slugger', 'slugify']
+
+
+MARKDOWN = {'.markdown', '.mdown', '.mkdn', '.mkd', '.md'}
 
 
 def parse_header(line):
@@ -55,51 +73,126 @@ def parse_list(line):
     return len(first) > 0 and (first[0] == '-' or first[0] == '*')
 
 
+class Slugger(object):
+    '''
+    Makes the anchors GitHub gives to the headers of one document: lower
+    case, punctuation dropped, spaces turned into hyphens, and a repeated
+    anchor suffixed with -1, -2, ...
+
+    Examples
+    --------
+    >>> slug = Slugger().slug
+    >>> slug('Why Use it?'), slug('Why use it'), slug('why-use-it')
+    ('why-use-it', 'why-use-it-1', 'why-use-it-2')
+    >>> slug('[`auto_toc`](toc.py) & C++ ##')
+    'auto_toc--c'
+    '''
+
+    __slots__ = ('occurrences',)
+
+    def __init__(self):
+        self.occurrences = {}   # anchor ==> number of times repeated
+
+    def slug(self, text):
+        '''
+        Returns the anchor of the next header with text.
+        '''
+        slug = base = slugify(text)
+        occurrences = self.occurrences
+        while slug in occurrences:
+            occurrences[base] += 1
+            slug = '%s-%d' % (base, occurrences[base])
+        occurrences[slug] = 0
+        return slug
+
+
+_LINK = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')   # [text](url) ==> text
+_CLOSING = re.compile(r'(?:^|\s+)#+\s*$')          # '## Header ##'
+_PUNCTUATION = re.compile(r'[^\w\- ]')
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def slugify(text):
+    '''
+    The anchor of a header with text, before any suffix for repeats.
+    Markdown headers repeat a lot across documents, hence the cache.
+
+    Examples
+    --------
+    >>> slugify('Make / Update TOC (for *Markdown*) files\\n')
+    'make--update-toc-for-markdown-files'
+    '''
+    text = _CLOSING.sub('', _LINK.sub(r'\1', text.strip()))
+    return _PUNCTUATION.sub('', text.lower()).replace(' ', '-')
+
+
 @catch()
-def auto_toc(filename, has_title, has_toc_header, toc_header, override):
+def auto_toc(filename, has_title, has_toc_header, toc_header, override,
+             backup=True, verbose=True):
+    '''
+    Makes or updates the table of contents (TOC) of a markdown file, telling
+    each step as it goes unless verbose is False.
+
+    The file is read once and scanned in memory. If the new TOC is the same
+    as the old one, nothing is written; otherwise a temporary file is made
+    from the new TOC and the untouched parts of the file before and after
+    it, copied by the kernel where possible, and then atomically replaces
+    the file. The back-up copy, if any, is a hard link to the original file
+    where possible, so it costs no copying.
 
+    Returns True if the file was written, False if it was up to date.
+    '''
+
+    say = print if verbose else _silent
     name, ext = os.path.splitext(filename)
-    print('\nReading %s ...' % filename)
-    if ext.lower() not in {'.markdown', '.mdown', '.mkdn', '.mkd', '.md'}:
+    say('\nReading %s ...' % filename)
+    if ext.lower() not in MARKDOWN:
         raise IOError('Expect a markdown file, but file extension is %s.'
                       % ext)
-    copyname = name + '.bak'
-    print('\nSaving a back-up copy to %s ...' % copyname)
-    shutil.copyfile(filename, copyname)
+    with open(filename, 'rb') as f:
+        data = f.read()
+    size = len(data)
+    lines = data.decode('utf8').splitlines(keepends=True)
+    del data
 
     headers = []   # list of tuple of 3: [(line number, level, contents), ...]
     lists = []     # list of line numbers of markdown lists
-    empty = []     # list of line number of empty lines
+    empty = set()  # set of line numbers of empty lines
     top_level = 7  # top level among all headers, not counting title, toc
 
     # scan a markdown file for headers, lists, and empty lines
-    print('\nScanning file for headers ...')
-    with codecs.open(filename, mode='r', encoding='utf8') as f:
-        for i, line in enumerate(f):
-            line = line.lstrip()
-            if len(line) > 0:
-                if line[0] == '#':
-                    result = parse_header(line)
-                    if result[0]:
-                        headers.append((i + 1, result[0], result[1]))
-                elif line[0] == '-' or line[0] == '*':
-                    if parse_list(line):
-                        lists.append(i + 1)
-            else:
-                empty.append(i + 1)
+    say('\nScanning file for headers ...')
+    for i, line in enumerate(lines):
+        line = line.lstrip()
+        if len(line) > 0:
+            if line[0] == '#':
+                result = parse_header(line)
+                if result[0]:
+                    headers.append((i + 1, result[0], result[1]))
+            elif line[0] == '-' or line[0] == '*':
+                if parse_list(line):
+                    lists.append(i + 1)
+        else:
+            empty.add(i + 1)
+
+    # anchors are unique within a document, the title and toc header count
+    slug = Slugger().slug
 
     # get line number of title, if any
     title_line = 0
     if has_title and len(headers) > 0:
-        print('\nReading title: %s ...' % headers[0][2][:10].rstrip())
+        say('\nReading title: %s ...' % headers[0][2][:10].rstrip())
         title_line = headers[0][0]
+        slug(headers[0][2])
         headers = headers[1:]
 
     # get line number of header for toc, if any
     toc_line = title_line
     if has_toc_header and len(headers) > 0:
-        print('\nReading TOC header: %s ...' % headers[0][2][:10].rstrip())
+        say('\nReading TOC header: %s ...' % headers[0][2][:10].rstrip())
         toc_line = headers[0][0]
+        if toc_header is None:
+            slug(headers[0][2])
         headers = headers[1:]
 
     # get top level among all headers, if any (top level is smallest level)
@@ -109,58 +202,368 @@ def auto_toc(filename, has_title, has_toc_header, toc_header, override):
 
     # prepare new toc header
     if toc_header is not None:
-        print('\nPreparing new TOC header: %s ...' % toc_header)
+        say('\nPreparing new TOC header: %s ...' % toc_header)
+        slug(toc_header)
         toc_header = '#' * top_level + ' ' + toc_header
 
     # decide where to remove, in order to override old toc
     to_remove = [x for x in lists
                  if x > toc_line and (len(headers) == 0 or x < headers[0][0])]
 
-    # plan to remove the entire old toc area and all the following empty lines
-    if toc_header is not None:
+    # plan to remove the entire old toc area and all the following empty
+    # lines, as an interval of line numbers: [first, last]
+    if toc_header is not None and toc_line > title_line:
         to_remove = [toc_line] + to_remove
     if len(to_remove) > 0:
-        to_remove = list(range(to_remove[0], to_remove[-1] + 1))
-        while to_remove[-1] + 1 in empty:
-            to_remove.append(to_remove[-1] + 1)
-        print('\nDetected an existing TOC, from line %d to line %d ...' %
-              (to_remove[0], to_remove[-1]))
+        first, last = to_remove[0], to_remove[-1]
+        while last + 1 in empty:
+            last += 1
+        say('\nDetected an existing TOC, from line %d to line %d ...' %
+            (first, last))
 
     # prepare new toc
-    toc = ''
+    toc = []
     indent = last_indent = 0
     for h in headers:
         # try best to reflect toc structure while following markdown rules
         indent = min(h[1] - top_level, last_indent + 1)
-        anchor = '#user-content-' + '-'.join(h[2].lower().split())
-        toc += '\n%s- [%s](%s)\n' % ('    ' * indent, h[2].rstrip(), anchor)
+        anchor = '#user-content-' + slug(h[2])
+        toc.append('\n%s- [%s](%s)\n' % ('    ' * indent, h[2].rstrip(),
+                                          anchor))
         last_indent = indent
+    # a toc header stands on a line of its own, even over an empty toc
+    block = [toc_header + ('' if toc else '\n') if toc_header else ''] + toc
+
+    # the new file is lines[:start] + block + lines[stop:]
+    start = stop = toc_line
+    if override and len(to_remove) > 0:
+        if first == toc_line:
+            # the old toc header goes, and the new one takes its place
+            start = toc_line - 1
+        else:
+            # lines between the toc line and the old toc stay, after the toc
+            block += lines[toc_line:first - 1]
+        stop = last
+
+    # write file, if anything changed
+    old = ''.join(lines[start:stop])
+    new = ''.join(block)
+    if new == old:
+        say('\nTOC for %d headers is up to date ...' % len(headers))
+        say('\nFinish ...')
+        return False
+    say('\nMaking / Updating TOC for %d headers ...' % len(headers))
+    # only the toc is encoded, the rest is copied as bytes
+    offset = len(''.join(lines[:start]).encode('utf8'))
+    end = offset + len(old.encode('utf8'))
+    _replace(filename, [(0, offset), new.encode('utf8'), (end, size)],
+             name + '.bak' if backup else None, say)
+
+    say('\nFinish ...')
+    return True
+
+
+def _silent(*args):
+    pass
+
+
+def _replace(filename, pieces, copyname=None, say=print):
+    '''
+    Atomically replaces the contents of filename, or creates it, with pieces
+    one after another, keeping the old file as copyname if given. A piece is
+    either bytes, or a range of bytes (start, stop) of the old file, which
+    is copied without passing through Python where the OS allows.
+    '''
+    if copyname is not None:
+        say('\nSaving a back-up copy to %s ...' % copyname)
+        if os.path.lexists(copyname):
+            os.remove(copyname)
+        try:
+            os.link(filename, copyname)
+        except OSError:
+            shutil.copyfile(filename, copyname)
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(filename) or '.',
+                                prefix='.toc-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            src = None
+            try:
+                for piece in pieces:
+                    if isinstance(piece, bytes):
+                        f.write(piece)
+                        continue
+                    if src is None:
+                        src = open(filename, 'rb')
+                    f.flush()
+                    _copy_range(src.fileno(), f.fileno(), *piece)
+            finally:
+                if src is not None:
+                    src.close()
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(filename):
+            shutil.copymode(filename, temp)
+        os.replace(temp, filename)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+
+def _copy_range(src, dst, start, stop):
+    '''
+    Appends bytes start to stop of file descriptor src to file descriptor
+    dst, with copy_file_range or sendfile if possible, or else read/write.
+    '''
+    os.lseek(dst, 0, os.SEEK_END)
+    for copy in (getattr(os, 'copy_file_range', None),
+                 getattr(os, 'sendfile', None)):
+        if copy is None:
+            continue
+        try:
+            while start < stop:
+                if copy is os.sendfile:
+                    n = copy(dst, src, start, stop - start)
+                else:
+                    n = copy(src, dst, stop - start, start)
+                if n == 0:
+                    break
+                start += n
+            if start >= stop:
+                return
+        except OSError:
+            # not supported for these files, try the next way;
+            # dst may have grown by a partial copy, so go on from there
+            pass
+    while start < stop:
+        chunk = os.pread(src, min(stop - start, 1 << 20), start)
+        if not chunk:
+            break
+        os.write(dst, chunk)
+        start += len(chunk)
 
-    # write file
-    print('\nMaking / Updating TOC for %d headers ...' % len(headers))
-    i = 1
-    for line, new in inplace(filename):
-        # insert at the beginning, if applicable
-        if toc_line == 0 and i == 1:
-            if toc_header is not None:
-                line = toc_header + toc + line
-            line = toc + line
-        # remove old toc
-        if override and (i in to_remove):
-            line = ''
-        # insert after toc line, if applicable
-        if i == toc_line:
-            if toc_header is not None:
-                line += toc_header
-            line += toc
-        new.write(line)
-        i += 1
-
-    print('\nFinish ...')
+
+def auto_toc_batch(paths, has_title=True, has_toc_header=True,
+                   toc_header=None, override=True, backup=False,
+                   processes=None, cache=None, verbose=True):
+    '''
+    Makes or updates the TOC of every markdown file found under paths,
+    without asking anything, across a pool of processes.
+
+    Parameters
+    ----------
+    paths : str or list of str
+        markdown files, directories to walk, or glob patterns like
+        'docs/**/*.md'; hidden directories are not walked
+    has_title, has_toc_header, toc_header, override, backup :
+        as in auto_toc, the same for every file, except that no back-up
+        copies are made unless asked for
+    processes : int or None (default: None)
+        size of the process pool, None for the number of CPUs; 1 to run in
+        this process
+    cache : str or None (default: None)
+        a JSON file that remembers the size, mtime and content hash of every
+        file after its TOC is made, so that a file that has not changed since
+        is skipped without being read, or read but not rewritten if only its
+        mtime has changed; None for no cache
+    verbose : bool (default: True)
+        whether to print the status and time of each file, and the totals
+
+    Returns
+    -------
+    list of (filename, status, seconds), status being 'updated', 'unchanged'
+    (read, but its TOC was up to date), 'skipped' (not even read) or
+    'failed: <error>'
+    '''
+
+    begin = time.perf_counter()
+    options = [has_title, has_toc_header, toc_header, override]
+    entries = _load_cache(cache, options)
+
+    results = []
+    todo = []
+    for filename in _find_markdown(paths):
+        t = time.perf_counter()
+        key = os.path.abspath(filename)
+        if _unchanged(filename, entries.get(key)):
+            results.append((filename, 'skipped', time.perf_counter() - t))
+        else:
+            todo.append(filename)
+
+    jobs = [(x, has_title, has_toc_header, toc_header, override, backup)
+            for x in todo]
+    if processes == 1 or len(jobs) < 2:
+        # not worth starting a pool; with CATCH=0, auto_toc is the plain
+        # function, and enable and disable leave it alone
+        was = is_enabled(auto_toc)
+        disable(auto_toc)
+        try:
+            done = [_auto_toc_job(job) for job in jobs]
+        finally:
+            if was:
+                enable(auto_toc)
+    else:
+        with ProcessPoolExecutor(processes, initializer=disable,
+                                 initargs=(auto_toc,)) as pool:
+            done = list(pool.map(_auto_toc_job, jobs,
+                                 chunksize=max(1, len(jobs) // 256)))
+
+    for filename, status, seconds, entry in done:
+        if entry is not None:
+            entries[os.path.abspath(filename)] = entry
+        results.append((filename, status, seconds))
+    if cache is not None:
+        _save_cache(cache, options, entries)
+
+    if verbose:
+        for filename, status, seconds in results:
+            if status != 'skipped':
+                print('%9.3f s  %-9s %s' % (seconds, status, filename))
+        count = {}
+        for _, status, _ in results:
+            status = status.split(':')[0]
+            count[status] = count.get(status, 0) + 1
+        print('%d files: %d updated, %d unchanged, %d skipped, %d failed, '
+              'in %.3f s'
+              % (len(results), count.get('updated', 0),
+                 count.get('unchanged', 0), count.get('skipped', 0),
+                 count.get('failed', 0),
+                 time.perf_counter() - begin))
+    return results
+
+
+def _find_markdown(paths):
+    '''
+    Yields each markdown file under paths once, in the order found.
+    '''
+    if isinstance(paths, str):
+        paths = [paths]
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for folder, dirs, files in os.walk(path):
+                dirs[:] = sorted(x for x in dirs if not x.startswith('.'))
+                found += [os.path.join(folder, x) for x in sorted(files)
+                          if os.path.splitext(x)[1].lower() in MARKDOWN]
+        elif os.path.isfile(path):
+            found = [path]
+        else:
+            found = sorted(x for x in glob.glob(path, recursive=True)
+                           if os.path.isfile(x) and
+                           os.path.splitext(x)[1].lower() in MARKDOWN)
+        for filename in found:
+            key = os.path.abspath(filename)
+            if key not in seen:
+                seen.add(key)
+                yield filename
+
+
+def _load_cache(cache, options):
+    '''
+    Returns the cache entries, {absolute filename: [size, mtime, hash]}, if
+    they were made with the same options, or else an empty dict.
+    '''
+    if cache is None:
+        return {}
+    try:
+        with open(cache, encoding='utf8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('options') != options:
+        return {}
+    return data.get('files', {})
+
+
+def _save_cache(cache, options, entries):
+    data = json.dumps({'options': options, 'files': entries})
+    _replace(cache, [data.encode('utf8')], say=_silent)
+
+
+def _stat(filename):
+    st = os.stat(filename)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _digest(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _unchanged(filename, entry):
+    '''
+    Tells whether filename is still as its cache entry remembers it. The
+    entry is brought up to date if only the mtime has changed.
+    '''
+    if entry is None:
+        return False
+    stat = _stat(filename)
+    if stat == entry[:2]:
+        return True
+    if stat[0] == entry[0] and _digest(filename) == entry[2]:
+        entry[1] = stat[1]
+        return True
+    return False
+
+
+def _auto_toc_job(job):
+    '''
+    Runs auto_toc quietly on one file, in a worker, and returns
+    (filename, status, seconds, cache entry or None).
+    '''
+    filename = job[0]
+    t = time.perf_counter()
+    try:
+        written = auto_toc(*job, verbose=False)
+        entry = _stat(filename) + [_digest(filename)]
+        status = 'updated' if written else 'unchanged'
+    except Exception as e:
+        entry = None
+        status = 'failed: %s' % e
+    return filename, status, time.perf_counter() - t, entry
+
+
+def main(argv=None):
+    '''
+    Command line for auto_toc_batch, as in
+        python toc.py docs README.md 'notes/**/*.md' --cache .toc-cache.json
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Make/Update Table of Contents (TOC) for Markdown Files')
+    parser.add_argument('paths', nargs='+',
+                        help='markdown files, directories or glob patterns')
+    parser.add_argument('--no-title', action='store_true',
+                        help='files have no header for title')
+    parser.add_argument('--no-toc-header', action='store_true',
+                        help='files have no header for table of contents')
+    parser.add_argument('--toc-header', default=None,
+                        help='new TOC header, if any')
+    parser.add_argument('--keep', action='store_true',
+                        help='do not override any existing TOC')
+    parser.add_argument('--backup', action='store_true',
+                        help='save a back-up copy of each file as .bak')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of processes (default: number of CPUs)')
+    parser.add_argument('--cache', default='.toc-cache.json',
+                        help='cache file (default: .toc-cache.json)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='process every file, and keep no cache')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='print nothing')
+    args = parser.parse_args(argv)
+    results = auto_toc_batch(
+        args.paths, not args.no_title, not args.no_toc_header,
+        args.toc_header, not args.keep, args.backup, args.processes,
+        None if args.no_cache else args.cache, not args.quiet)
+    return int(any(x[1].startswith('failed') for x in results))
 
 
 if __name__ == '__main__':
 
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
     print('----- Make/Update Table of Contents (TOC) for Markdown Files -----')
     filename = input('Enter filename '
                      '(press ENTER for \'README.md\') : ')